@@ -3,6 +3,9 @@
 # ============================================================
 
 import json
+import random
+import sys
+import time
 from datetime import datetime
 from typing import Any, List
 
@@ -151,9 +154,77 @@ def run_benchmark():
     print(f"✅ Benchmark complete → {LOG_FILE}")
 
 
+# ------------------------------------------------------------
+# Decode throughput (coil_python): escaped vs fast path,
+# eager decode_table vs streaming iter_decode_table
+# ------------------------------------------------------------
+
+DECODE_ROWS = 100_000
+
+
+def make_rows(n: int, escaped: bool, seed: int = 10):
+    rnd = random.Random(seed)
+    note = ["a,b", "x|y", "c:\\d"] if escaped else ["ab", "xy", "cd"]
+    return [
+        {
+            "user": f"user_{rnd.randint(0, 99999)}",
+            "city": f"city {rnd.randint(0, 9999)}",
+            "amount": rnd.randint(0, 10 ** 6),
+            "note": rnd.choice(note) + str(rnd.randint(0, 99999)),
+        }
+        for _ in range(n)
+    ]
+
+
+def plain_table(records):
+    """Row-major body with default delimiters (no codecs / dictionaries)."""
+    from coil_python.enc import build_table, collect_keys, render_rows, REC
+
+    keys = collect_keys(records)
+    table = build_table(records, keys)
+    header = f"table[{len(records)}]{{{','.join(keys)}}}"
+    rows = render_rows([c.escaped for c in table.columns])
+    meta = f"META&ORDER={','.join(keys)}&tid=tbl_1"
+    body = "BODY|" + REC.join([header] + rows)
+    return meta, body, {"tbl_1": table.types()}
+
+
+def run_decode_benchmark(rows: int = DECODE_ROWS):
+    from coil_python.dec import decode_table, iter_decode_table
+
+    print(f"COIL DECODE THROUGHPUT ({rows} rows x 4 columns)")
+    print("-" * 72)
+    for label, escaped in (("no escapes", False), ("with escapes", True)):
+        records = make_rows(rows, escaped)
+        meta, body, types = plain_table(records)
+        cells = rows * len(records[0])
+
+        start = time.perf_counter()
+        decoded = decode_table(meta, body, types)
+        eager = time.perf_counter() - start
+        assert decoded == records
+
+        start = time.perf_counter()
+        stream = iter_decode_table(meta, body, types)
+        next(stream)
+        first = time.perf_counter() - start
+        for _ in stream:
+            pass
+        streaming = time.perf_counter() - start
+
+        print(
+            f"{label:<13} eager {cells / eager:>11,.0f} cells/s | "
+            f"streaming {cells / streaming:>11,.0f} cells/s | "
+            f"first record {first * 1000:.2f} ms"
+        )
+
+
 # ------------------------------------------------------------
 # Entry
 # ------------------------------------------------------------
 
 if __name__ == "__main__":
-    run_benchmark()
+    if "--decode" in sys.argv:
+        run_decode_benchmark()
+    else:
+        run_benchmark()
@@ -1,14 +1,18 @@
 # __init__.py — COIL Public API
 # Stable, production-safe interface
 
-import json
-import os
-
-from .enc import encode as _encode
-from .dec import decode as _decode
+from .enc import Encoder
+from .dec import Decoder
+from .store import MemoryStore, FileStore, SQLiteStore, file_store
+from .prompt import render_prompt, parse_prompt, prompt_tokens, _check_output
+from .dictionary import (
+    TrainedDictionary, train_dictionary, load_dictionary, register as _register_dictionary,
+)
+from .plan import EncoderPlan, compile_plan
 
 from .stats import analyze, save_stats
-from .visual import show_charts
+from . import tokenizer
+from .tokenizer import TOKENIZER_MAP
 
 
 __all__ = [
@@ -17,7 +21,20 @@ __all__ = [
     "stats",
     "debugMode",
     "set_model",
-    "info"
+    "info",
+    "Encoder",
+    "Decoder",
+    "MemoryStore",
+    "FileStore",
+    "SQLiteStore",
+    "render_prompt",
+    "parse_prompt",
+    "prompt_tokens",
+    "TrainedDictionary",
+    "train_dictionary",
+    "load_dictionary",
+    "EncoderPlan",
+    "compile_plan",
 ]
 
 # =========================
@@ -28,20 +45,6 @@ _DEBUG = False
 _DEFAULT_STRUCTURE_FILE = "coil_types.json"
 _ACTIVE_MODEL = "default"
 
-# -------------------------
-# TOKENIZER MAP (logical only)
-# -------------------------
-
-TOKENIZER_MAP = {
-    "gpt-4o": "tiktoken:gpt-4o",
-    "gpt-4o-mini": "tiktoken:gpt-4o-mini",
-    "gpt-4.1": "tiktoken:gpt-4.1",
-    "claude-3": "anthropic",
-    "gemini": "google",
-    "mistral": "mistral",
-    "default": "generic"
-}
-
 # =========================
 # INTERNAL UTILITIES
 # =========================
@@ -67,36 +70,57 @@ def debugMode(flag: bool = True):
 
 
 def set_model(model_name: str):
-    """Select tokenizer backend (logical mapping only)."""
+    """Select the tokenizer backend used for optimization and stats."""
     global _ACTIVE_MODEL
     _ACTIVE_MODEL = model_name if model_name in TOKENIZER_MAP else "default"
-    _log(f"Tokenizer set to: {_ACTIVE_MODEL}")
+    backend = tokenizer.set_model(_ACTIVE_MODEL)
+    _log(f"Tokenizer set to: {_ACTIVE_MODEL} ({backend})")
 
 
 def encode(
     data,
     *,
     structure_file: str | None = None,
-    return_structure: bool = False
+    return_structure: bool = False,
+    store=None,
+    output: str = "json",
+    shared_dictionary: bool = False,
+    dictionary: TrainedDictionary | None = None
 ):
     """
     Encode JSON into COIL format.
+
+    The structure (type registry) goes to `store`, else to
+    `structure_file`. With `return_structure=True` and neither given,
+    it is returned as `(encoded, structure)` without any file I/O.
+    `output="text"` returns a plain-text prompt document instead of
+    meta/body objects (see render_prompt). `shared_dictionary=True`
+    lets values repeated across tables share one payload-level
+    dictionary when that is cheaper. A trained `dictionary` is applied
+    as-is (no per-table optimizer); the output carries only its id.
     """
-    structure_file = _ensure_json_ext(
-        structure_file or _DEFAULT_STRUCTURE_FILE
-    )
+    _check_output(output)
+
+    if store is None and (structure_file or not return_structure):
+        structure_file = _ensure_json_ext(
+            structure_file or _DEFAULT_STRUCTURE_FILE
+        )
+        store = file_store(structure_file)
 
     _log("Encoding started")
-    _log(f"Structure file: {structure_file}")
+    _log(f"Structure store: {getattr(store, 'path', store)}")
     _log(f"Tokenizer: {_ACTIVE_MODEL}")
 
-    encoded = _encode(data)
+    session = Encoder(dictionary=dictionary)
+    encoded = session.encode(data, shared=shared_dictionary)
+    if output == "text":
+        encoded = render_prompt(encoded)
+
+    if store is not None:
+        store.save(session.types)
 
     if return_structure:
-        if os.path.exists(structure_file):
-            with open(structure_file, "r", encoding="utf-8") as f:
-                return encoded, json.load(f)
-        return encoded, None
+        return encoded, session.types
 
     return encoded
 
@@ -104,24 +128,40 @@ def encode(
 def decode(
     encoded_data,
     *,
-    structure_file: str | None = None
+    structure_file: str | None = None,
+    structure: dict | None = None,
+    store=None,
+    output: str = "json",
+    dictionary: TrainedDictionary | None = None
 ):
     """
-    Decode COIL encoded data using structure metadata.
+    Decode COIL encoded data using structure metadata, taken from
+    `structure`, `store` or `structure_file` (in that order).
+    `output` is what encode was given: with "text" the plain-text
+    document is parsed first; a "json" string is never treated as one.
+    Payloads encoded with a trained dictionary need it registered
+    (train_dictionary / load_dictionary do that) or passed here.
     """
-    structure_file = _ensure_json_ext(
-        structure_file or _DEFAULT_STRUCTURE_FILE
-    )
+    if dictionary is not None:
+        _register_dictionary(dictionary)
 
-    _log("Decoding started")
-    _log(f"Structure file: {structure_file}")
+    _check_output(output)
+    if output == "text":
+        encoded_data = parse_prompt(encoded_data)
 
-    if not os.path.exists(structure_file):
-        raise FileNotFoundError(
-            f"Structure file not found: {structure_file}"
-        )
+    if structure is None:
+        if store is None:
+            structure_file = _ensure_json_ext(
+                structure_file or _DEFAULT_STRUCTURE_FILE
+            )
+            store = file_store(structure_file)
+
+        _log(f"Structure store: {getattr(store, 'path', store)}")
+        structure = store.load()
+
+    _log("Decoding started")
 
-    return _decode(encoded_data)
+    return Decoder(structure).decode(encoded_data)
 
 
 def info():
@@ -130,16 +170,17 @@ def info():
         "module": "coil",
         "version": "0.1.11",
         "tokenizer": _ACTIVE_MODEL,
+        "tokenizer_backend": tokenizer.backend().name,
         "debug": _DEBUG,
         "structure_file": _DEFAULT_STRUCTURE_FILE,
     }
 
 
-def stats(original, encoded, decoded=None, *, out="coil_stats.json"):
+def stats(original, encoded, decoded=None, *, out="coil_stats.json", output="json"):
     """
     Generate statistics and optionally save to a file.
     """
-    s = analyze(original, encoded, decoded)
+    s = analyze(original, encoded, decoded, output)
 
     _log(f"Token savings: {s['comparison']['token_saving_%']}%")
     _log(f"Byte savings: {s['comparison']['byte_saving_%']}%")
@@ -153,8 +194,7 @@ def stats(original, encoded, decoded=None, *, out="coil_stats.json"):
     return s
 
 def showCharts(original, encoded, decoded=None):
-    # from .stats import analyze
-    # from .visual import show_charts
+    from .visual import show_charts
 
     stats = analyze(original, encoded, decoded)
     show_charts(stats)
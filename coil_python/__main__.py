@@ -1,6 +1,7 @@
 import argparse
 import json
 from . import encode, decode, stats
+from .stream import encode_stream, decode_stream, CHUNK_ROWS
 
 def main():
     parser = argparse.ArgumentParser("coil")
@@ -9,10 +10,19 @@ def main():
     enc = sub.add_parser("encode")
     enc.add_argument("input")
     enc.add_argument("-o", "--out", default="encoded.json")
+    enc.add_argument("--stream", action="store_true",
+                     help="incrementally encode a top-level JSON array in row chunks")
+    enc.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    enc.add_argument("--text", action="store_true",
+                     help="write a plain-text prompt document instead of JSON")
 
     dec = sub.add_parser("decode")
     dec.add_argument("input")
     dec.add_argument("-o", "--out", default="decoded.json")
+    dec.add_argument("--stream", action="store_true",
+                     help="write records one per line (NDJSON) as they are decoded")
+    dec.add_argument("--text", action="store_true",
+                     help="input is a plain-text prompt document (encode --text)")
 
     st = sub.add_parser("stats")
     st.add_argument("original")
@@ -21,17 +31,33 @@ def main():
 
     args = parser.parse_args()
 
-    if args.cmd == "encode":
+    if args.cmd == "encode" and args.stream:
+        with open(args.input, encoding="utf-8") as fin, \
+             open(args.out, "w", encoding="utf-8") as fout:
+            encode_stream(fin, fout, chunk_rows=args.chunk_rows)
+
+    elif args.cmd == "encode":
         with open(args.input) as f:
             data = json.load(f)
-        result = encode(data)
+        result = encode(data, output="text" if args.text else "json")
         with open(args.out, "w") as f:
-            json.dump(result, f, indent=2)
+            if args.text:
+                f.write(result)
+            else:
+                json.dump(result, f, indent=2)
+
+    elif args.cmd == "decode" and args.stream:
+        with open(args.input, encoding="utf-8") as fin, \
+             open(args.out, "w", encoding="utf-8") as fout:
+            decode_stream(fin, fout)
 
     elif args.cmd == "decode":
         with open(args.input) as f:
-            data = json.load(f)
-        result = decode(data)
+            text = f.read()
+        if args.text:
+            result = decode(text, output="text")
+        else:
+            result = decode(json.loads(text))
         with open(args.out, "w") as f:
             json.dump(result, f, indent=2)
 
@@ -46,3 +72,6 @@ def main():
 
     else:
         parser.print_help()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,398 @@
+# colcodec.py — Per-column value codecs for COIL tables
+# Integer / ISO-8601 columns: delta, base+offset (for), constant step
+# ISO-8601 columns: shared prefix hoisted into a template
+# Chosen per column by token cost; meta carries the spec, e.g.
+#   CODEC=minute:step(1,1);pressure:for(1010);ts:iso-delta(2025-01-01T00:00:00)
+#   CODEC=ts:iso-prefix(2025-03-21T10:mm:ssZ)   (cells: "1602", ...)
+# ID columns: constant prefix + arithmetic suffix, exceptions in meta
+#   CODEC=txn_id:seq(TXN,1001,1,@4=TXN2000)      (no body cells)
+# Constant columns move into meta as well
+#   CODEC=status:const(OK)
+
+import re
+from datetime import date
+
+from .ir import MISSING
+
+CODEC_KEY = "__codec__"   # type-registry entry: {column: codec name}
+
+# ---------------- ISO-8601 ----------------
+
+_ISO = re.compile(
+    r"(\d{4})-(\d{2})-(\d{2})"
+    r"(?:([T ])(\d{2}):(\d{2}):(\d{2})(Z|[+-]\d{2}:\d{2})?)?",
+    re.ASCII,   # int() would also read non-ASCII digits, then render ASCII
+)
+
+
+def iso_format_of(s):
+    """(separator, suffix) of an ISO date/datetime string, else None."""
+    m = _ISO.fullmatch(s)
+    if not m:
+        return None
+    return (m.group(4), m.group(8) or "")
+
+
+def iso_to_int(s, fmt):
+    """Days (date) or seconds (datetime) since 0001-01-01; None if not in `fmt`."""
+    m = _ISO.fullmatch(s)
+    if not m or (m.group(4), m.group(8) or "") != fmt:
+        return None
+    y, mo, d = int(m.group(1)), int(m.group(2)), int(m.group(3))
+    try:
+        days = date(y, mo, d).toordinal()
+    except ValueError:
+        return None
+    if fmt[0] is None:
+        return days
+    h, mi, sec = int(m.group(5)), int(m.group(6)), int(m.group(7))
+    if h > 23 or mi > 59 or sec > 59:
+        return None
+    return days * 86400 + h * 3600 + mi * 60 + sec
+
+
+def int_to_iso(n, fmt):
+    sep, suffix = fmt
+    if sep is None:
+        return date.fromordinal(n).isoformat()
+    days, rem = divmod(n, 86400)
+    h, rem = divmod(rem, 3600)
+    mi, sec = divmod(rem, 60)
+    return f"{date.fromordinal(days).isoformat()}{sep}{h:02d}:{mi:02d}:{sec:02d}{suffix}"
+
+# field placeholders of YYYY-MM-DDThh:mm:ss, and where prefixes may end
+ISO_FIELDS = "YYYY-MM-DD hh:mm:ss"
+ISO_CUTS = (0, 5, 8, 11, 14, 17)
+PLACEHOLDERS = "YMDhms"
+
+
+def iso_prefix_template(vals, fmt):
+    """
+    Hoist the longest field-aligned prefix shared by all values.
+    Returns (template, cells): varying digits become placeholders in
+    the template and each cell is just those digits.
+    """
+    end = 10 if fmt[0] is None else 19   # date / datetime part
+    first = vals[0]
+    lcp = end
+    for v in vals:
+        while lcp and v[:lcp] != first[:lcp]:
+            lcp -= 1
+    cut = max(c for c in ISO_CUTS if c <= lcp and c <= end)
+
+    varying = "".join(
+        ISO_FIELDS[i] if first[i].isdigit() else first[i]
+        for i in range(cut, end)
+    )
+    template = first[:cut] + varying + first[end:]
+    cells = [
+        "".join(ch for ch in v[cut:end] if ch.isdigit())
+        for v in vals
+    ]
+    return template, cells
+
+
+def fill_template(template, digits):
+    out = []
+    i = 0
+    for ch in template:
+        if ch in PLACEHOLDERS:
+            out.append(digits[i])
+            i += 1
+        else:
+            out.append(ch)
+    if i != len(digits):
+        raise ValueError(f"Cell {digits!r} does not fit {template!r}")
+    return "".join(out)
+
+# ---------------- COLUMN DOMAINS ----------------
+
+def int_domain(col):
+    """
+    Map a column onto integers if a codec can reverse it exactly.
+    Returns (ints, to_text, codec name prefix, ISO format or None).
+    """
+    vals = col.values
+    if col.type == "int" and all(type(v) is int for v in vals):
+        return vals, str, "", None
+
+    if col.type == "str" and vals and all(type(v) is str for v in vals):
+        fmt = iso_format_of(vals[0])
+        if fmt is None:
+            return None
+        ints = []
+        for v in vals:
+            n = iso_to_int(v, fmt)
+            if n is None:
+                return None
+            ints.append(n)
+        return ints, (lambda n: int_to_iso(n, fmt)), "iso-", fmt
+
+    return None
+
+# ---------------- ENCODER SIDE ----------------
+
+def int_codecs(col):
+    """
+    Candidate (spec, cells) encodings for an integer-like column.
+    cells is None when the column needs no body cells at all.
+    """
+    dom = int_domain(col)
+    if dom is None or len(dom[0]) < 2:
+        return []
+
+    ints, to_text, kind, fmt = dom
+    out = []
+
+    if fmt is not None:
+        template, cells = iso_prefix_template(col.values, fmt)
+        out.append((f"iso-prefix({template})", cells))
+
+    diffs = [b - a for a, b in zip(ints, ints[1:])]
+    if all(d == diffs[0] for d in diffs):
+        out.append((f"{kind}step({to_text(ints[0])},{diffs[0]})", None))
+    else:
+        out.append((
+            f"{kind}delta({to_text(ints[0])})",
+            ["0"] + [str(d) for d in diffs],
+        ))
+        base = min(ints)
+        out.append((
+            f"{kind}for({to_text(base)})",
+            [str(n - base) for n in ints],
+        ))
+
+    return out
+
+
+# ---------------- ID SEQUENCES ----------------
+
+_UNSAFE = set(",;&()\\")   # cannot appear inside a meta codec argument
+_KEY_UNSAFE = set(":;,&")   # cannot appear in the key of a `key:spec;...` entry
+_TRAILING_DIGITS = re.compile(r"([0-9]+)$")   # ASCII: seq_number rejects others
+
+
+def _safe(s):
+    return not any(ch in _UNSAFE for ch in s)
+
+
+def meta_key_safe(key):
+    """A column key that can head a CODEC / CMAP meta entry."""
+    return not any(ch in _KEY_UNSAFE for ch in key)
+
+
+def seq_number(v, prefix, width):
+    """Numeric suffix of `v` if it is exactly prefix + number, else None."""
+    if not v.startswith(prefix):
+        return None
+    digits = v[len(prefix):]
+    if not digits.isdigit() or not digits.isascii():
+        return None
+    n = int(digits)
+    if str(n).zfill(width) != digits:
+        return None
+    return n
+
+
+def seq_render(prefix, n, width):
+    return prefix + str(n).zfill(width)
+
+
+def seq_codecs(col):
+    """
+    IDs like TXN1001, TXN1002 ...: constant prefix plus an arithmetic
+    suffix. Rows that break the sequence are listed as exceptions; a
+    well-formed exception re-anchors the sequence (a gap costs one).
+    """
+    if col.type not in ("str", "int") or col.n_rows < 2:
+        return []
+    if any(type(v).__name__ != col.type for v in col.values):
+        return []
+
+    vals = col.raw
+    m = _TRAILING_DIGITS.search(vals[0])
+    if not m:
+        return []
+    prefix = vals[0][:m.start()]
+    digits = m.group(1)
+    width = len(digits) if digits.startswith("0") and len(digits) > 1 else 0
+    if not _safe(prefix):
+        return []
+
+    nums = [seq_number(v, prefix, width) for v in vals]
+    conforming = [n for n in nums if n is not None]
+    if nums[0] is None or len(conforming) < 2:
+        return []
+    step = conforming[1] - conforming[0]
+
+    exceptions = []
+    cur = nums[0] - step
+    for i, (v, n) in enumerate(zip(vals, nums)):
+        cur += step
+        if n == cur:
+            continue
+        if not _safe(v):
+            return []
+        exceptions.append(f"@{i}={v}")
+        if n is not None:
+            cur = n
+
+    if len(exceptions) * 2 > len(vals):
+        return []
+
+    args = [prefix, str(nums[0]), str(step)]
+    if width:
+        args.append(f"w={width}")
+    return [(f"seq({','.join(args + exceptions)})", None)]
+
+
+# ---------------- CONSTANT COLUMNS ----------------
+
+def const_codecs(col):
+    """The same value in every row (no missing keys): hoisted into meta."""
+    if col.cardinality != 1 or col.n_rows < 2:
+        return []
+    if any(v is MISSING for v in col.values):
+        return []
+    v = col.raw[0]
+    if not _safe(v):
+        return []
+    return [(f"const({v})", None)]
+
+
+def column_codecs(col):
+    return const_codecs(col) + int_codecs(col) + seq_codecs(col)
+
+
+def choose_codecs(table, count, cells_cost):
+    """
+    Per column, the codec whose cells + spec cost fewer tokens than the
+    plain escaped column. `cells_cost(cells)` prices a cell list in the
+    body. Returns {key: (spec, cells or None)}.
+    """
+    chosen = {}
+    for col in table.columns:
+        if not meta_key_safe(col.key):
+            continue
+        options = column_codecs(col)
+        if not options:
+            continue
+
+        best = cells_cost(col.escaped)
+        if col.cardinality == 1:
+            # a constant is only cheap as one run; row-major repeats it
+            best = count(",".join(col.escaped))
+        pick = None
+        for spec, cells in options:
+            cost = count(f";{col.key}:{spec}")
+            if cells is not None:
+                cost += cells_cost(cells)
+            if cost < best:
+                best, pick = cost, (spec, cells)
+
+        if pick:
+            chosen[col.key] = pick
+    return chosen
+
+
+def codec_meta(chosen):
+    return ";".join(f"{k}:{spec}" for k, (spec, _) in chosen.items())
+
+# ---------------- DECODER SIDE ----------------
+
+_SPEC = re.compile(r"([\w-]+)\((.*)\)", re.S)
+
+
+def parse_codecs(text):
+    """`k:name(args);...` -> {key: (name, [args])}"""
+    out = {}
+    for entry in text.split(";"):
+        key, spec = entry.split(":", 1)
+        m = _SPEC.fullmatch(spec)
+        if not m:
+            raise ValueError(f"Bad codec spec for {key!r}: {spec}")
+        out[key] = (m.group(1), m.group(2).split(","))
+    return out
+
+
+def column_decoder(name, args):
+    """
+    Stateful per-row decoder: call with each row's cell (None for
+    codecs without body cells) and get the column's text value back.
+    """
+    if name == "seq":
+        return seq_decoder(args)
+
+    if name == "const":
+        value = args[0]
+        def const_next(_cell):
+            return value
+        return const_next
+
+    kind, _, op = name.rpartition("-")
+    if name == "iso-prefix":
+        template = args[0]
+        def prefix_next(cell):
+            return fill_template(template, cell)
+        return prefix_next
+
+    if kind == "iso":
+        fmt = iso_format_of(args[0])
+        if fmt is None:
+            raise ValueError(f"Bad ISO base: {args[0]}")
+        base = iso_to_int(args[0], fmt)
+        def to_text(n): return int_to_iso(n, fmt)
+    elif kind == "":
+        base = int(args[0])
+        to_text = str
+    else:
+        raise ValueError(f"Unknown codec: {name}")
+
+    if op == "step":
+        step = int(args[1])
+        state = [base - step]
+        def step_next(_cell):
+            state[0] += step
+            return to_text(state[0])
+        return step_next
+
+    if op == "delta":
+        state = [base]
+        def delta_next(cell):
+            state[0] += int(cell)
+            return to_text(state[0])
+        return delta_next
+
+    if op == "for":
+        def for_next(cell):
+            return to_text(base + int(cell))
+        return for_next
+
+    raise ValueError(f"Unknown codec: {name}")
+
+
+def seq_decoder(args):
+    prefix, start, step = args[0], int(args[1]), int(args[2])
+    width = 0
+    exceptions = {}
+    for a in args[3:]:
+        if a.startswith("w="):
+            width = int(a[2:])
+        elif a.startswith("@"):
+            i, v = a[1:].split("=", 1)
+            exceptions[int(i)] = v
+
+    state = [start - step, -1]   # current number, row index
+
+    def seq_next(_cell):
+        state[0] += step
+        state[1] += 1
+        v = exceptions.get(state[1])
+        if v is None:
+            return seq_render(prefix, state[0], width)
+        n = seq_number(v, prefix, width)
+        if n is not None:
+            state[0] = n
+        return v
+
+    return seq_next
@@ -4,27 +4,95 @@
 # - original scalar types (via side-channel)
 # - categorical logs (table -> list[str])
 
-import json
-from copy import deepcopy
+import re
+import string
+from functools import lru_cache
+from itertools import repeat
+
+from .store import file_store
+from .colcodec import parse_codecs, column_decoder, CODEC_KEY
+from .fragments import parse_fragments, fragment_decoder
+from .templates import parse_templates, fill_slots
+from .dictionary import resolve as resolve_dictionary
 
 ESC = "\\"
 PAIR = ","
 REC = "|"
+RUN = "*"      # column-major run-length marker
+REF = "^"      # row back-reference marker (LAYOUT=ref)
 TYPE_FILE = "coil_types.json"
 
+CMAP_ALIASES = string.ascii_letters
+
+STREAM_KEY = "__stream__"   # set by the chunked (streaming) encoder
+SHARED_KEY = "__shared__"   # payload wrapped with a shared dictionary
+
+# ---------------- DELIMITER SYNTAX ----------------
+
+class Syntax:
+    """
+    Escape / pair / record characters of one table (meta DELIM=, the
+    default is \\,|) and the patterns that scan a body written with them.
+    """
+
+    def __init__(self, delims: str):
+        self.esc, self.pair, self.rec = delims
+        e, p, r = map(re.escape, delims)
+
+        self.unesc_re = re.compile(f"{e}(.)", re.S)
+        # one raw cell: plain runs or escaped pairs, up to the next bare pair / rec
+        self.cell = re.compile(f"(?:[^{e}{p}{r}]+|{e}.)*", re.S)
+        # column-major run: `v*k` (an escaped * is literal)
+        self.run = re.compile(f"((?:[^{e}*]|{e}.)*)\\*(\\d+)", re.S)
+        # one column-major segment: up to the next bare record separator
+        self.segment = re.compile(f"(?:[^{e}{r}]+|{e}.)*", re.S)
+        # back-reference targets (a superset: may also hit escaped text)
+        self.ref = re.compile(f"{r}\\^(\\d+)")
+
+    def unesc(self, v: str) -> str:
+        if self.esc not in v:
+            return v
+        return self.unesc_re.sub(r"\1", v)
+
+
+@lru_cache(maxsize=None)
+def syntax(delims: str = ESC + PAIR + REC) -> Syntax:
+    return Syntax(delims)
+
+
+DEFAULT_SYNTAX = syntax()
+
 # ---------------- UNESCAPE ----------------
 
 def unesc(v: str) -> str:
-    out = []
-    i = 0
-    while i < len(v):
-        if v[i] == ESC and i + 1 < len(v):
-            out.append(v[i + 1])
-            i += 2
-        else:
-            out.append(v[i])
-            i += 1
-    return "".join(out)
+    return DEFAULT_SYNTAX.unesc(v)
+
+# ---------------- ROW / CELL SCANNER ----------------
+
+def iter_cells(body: str, pos: int, syn: Syntax = DEFAULT_SYNTAX):
+    """
+    Single escape-aware pass from `pos`: yield each row as a list of raw
+    (still escaped) cells. Escaped delimiters stay inside their cell.
+    """
+    n = len(body)
+    row = []
+    cell = syn.cell
+    while True:
+        m = cell.match(body, pos)
+        row.append(m.group())
+        pos = m.end()
+        if pos >= n:
+            yield row
+            return
+        ch = body[pos]
+        pos += 1
+        if ch == syn.rec:
+            yield row
+            row = []
+        elif ch == syn.esc:  # dangling escape at the very end
+            row[-1] += ch
+            yield row
+            return
 
 # ---------------- TYPE RESTORE ----------------
 
@@ -41,16 +109,14 @@ def restore_type(v, t):
 
 # ---------------- TABLE DECODER ----------------
 
-def decode_table(meta: str, body: str, types: dict):
+def parse_meta(meta: str):
     meta = meta[len("META&"):]
-    body = body[len("BODY|"):]
 
     meta_kv = dict(p.split("=", 1) for p in meta.split("&") if "=" in p)
 
     keys = meta_kv["ORDER"].split(",")
     table_id = meta_kv.get("tid")
 
-    col_types = types.get(table_id, {})
     vmap = {}
 
     if "vmap" in meta_kv:
@@ -58,41 +124,336 @@ def decode_table(meta: str, body: str, types: dict):
             tok, val = e.split(":", 1)
             vmap[tok] = val
 
-    rows = body.split(REC)[1:]
-    records = []
+    # per-column dictionaries: aliases a, b, ... by position
+    cmaps = {}
+    if "CMAP" in meta_kv:
+        for e in meta_kv["CMAP"].split(";"):
+            key, vals = e.split(":", 1)
+            cmaps[key] = dict(zip(CMAP_ALIASES, vals.split(PAIR)))
 
-    for row in rows:
-        vals = row.split(PAIR)
-        rec = {}
-        for i, k in enumerate(keys):
-            raw = vals[i] if i < len(vals) else ""
-            val = vmap.get(raw, unesc(raw))
-            rec[k] = restore_type(val, col_types.get(k, "str"))
-        records.append(rec)
+    return {
+        "keys": keys,
+        "tid": table_id,
+        "vmap": vmap,
+        "cmaps": cmaps,
+        "layout": meta_kv.get("LAYOUT", "row"),
+        "delims": meta_kv.get("DELIM", ESC + PAIR + REC),
+        "codecs": parse_codecs(meta_kv["CODEC"]) if "CODEC" in meta_kv else {},
+        "fragments": parse_fragments(meta_kv["FRAG"]) if "FRAG" in meta_kv else {},
+        "templates": parse_templates(meta_kv["TPL"]) if "TPL" in meta_kv else None,
+    }
+
+
+def iter_rows(body: str, rec: str = REC):
+    """Yield raw row strings lazily (no full split of the body)."""
+    pos = body.find(rec, len("BODY|"))  # end of table[n]{...} header
+    while pos != -1:
+        nxt = body.find(rec, pos + 1)
+        yield body[pos + 1:] if nxt == -1 else body[pos + 1:nxt]
+        pos = nxt
+
+
+def parse_header(body: str, rec: str = REC):
+    """BODY|table[n]{k1,k2}|... -> (n, body column keys)"""
+    end = body.find(rec, len("BODY|"))
+    header = body[len("BODY|"):] if end == -1 else body[len("BODY|"):end]
+    n = int(header[len("table["):header.index("]")])
+    cols = header[header.index("{") + 1:header.rindex("}")]
+    return n, cols.split(",") if cols else []
+
+
+def expand_runs(cells, syn: Syntax = DEFAULT_SYNTAX):
+    """Column-major cells: `v*k` is v repeated k times (escaped * is literal)."""
+    run = syn.run
+    for c in cells:
+        m = run.fullmatch(c) if RUN in c else None
+        if m:
+            yield from repeat(m.group(1), int(m.group(2)))
+        else:
+            yield c
+
+
+def segment_bounds(body: str, pos: int, syn: Syntax, escaped: bool):
+    """(start, end) of each column-major segment from `pos`, in one scan."""
+    n = len(body)
+    bounds = []
+    while True:
+        if escaped:
+            end = syn.segment.match(body, pos).end()
+            if end < n and body[end] != syn.rec:  # dangling escape at the very end
+                end = n
+        else:
+            end = body.find(syn.rec, pos)
+            if end == -1:
+                end = n
+        bounds.append((pos, end))
+        if end >= n:
+            return bounds
+        pos = end + 1
+
+
+def iter_segment(body: str, start: int, end: int, syn: Syntax, escaped: bool):
+    """Raw cells of one column-major segment, lazily."""
+    pair = syn.pair
+    pos = start
+    while True:
+        if escaped:
+            stop = syn.cell.match(body, pos, end).end()
+            if stop < end and body[stop] != pair:  # dangling escape
+                stop = end
+        else:
+            stop = body.find(pair, pos, end)
+            if stop == -1:
+                stop = end
+        yield body[pos:stop]
+        if stop >= end:
+            return
+        pos = stop + 1
+
+
+def transpose(columns, n: int):
+    """Zip lazy column iterators into rows; each must yield exactly n cells."""
+    count = 0
+    try:
+        for row in zip(*columns, strict=True):
+            count += 1
+            yield row
+    except ValueError:
+        raise ValueError("Column-major body: columns differ in length") from None
+    if count != n:
+        raise ValueError(f"Column-major body: expected {n} cells, got {count}")
+
+
+_REF = re.compile(r"\^(\d+)(?:\*(\d+))?")
+
+def expand_refs(rows, targets=None):
+    """
+    Row back-references: `^i` repeats row i, `^i*k` k times. Only rows
+    in `targets` (the indices referenced anywhere; None = all) are kept.
+    """
+    seen = {}
+    n = 0
+    for cells in rows:
+        m = _REF.fullmatch(cells[0]) if len(cells) == 1 else None
+        if m:
+            row = seen[int(m.group(1))]
+            for _ in range(int(m.group(2) or 1)):
+                n += 1
+                yield row
+        else:
+            if targets is None or n in targets:
+                seen[n] = cells
+            n += 1
+            yield cells
+
+
+def iter_raw_rows(body: str, layout: str = "row", syn: Syntax = DEFAULT_SYNTAX):
+    """
+    Raw cell lists per row. Bodies without escapes take the fast path
+    (plain str.split, nothing to unescape); the flag says which.
+    Column-major bodies are located in one scan and then walked column
+    by column in lockstep; back-referenced rows are expanded in order,
+    holding on to referenced rows only.
+    """
+    start = body.find(syn.rec, len("BODY|"))  # end of table[n]{...} header
+    if start == -1:
+        # every column lives in meta: n empty rows
+        return ([] for _ in range(parse_header(body, syn.rec)[0])), False
+
+    escaped = syn.esc in body
+    if layout == "col":
+        n = parse_header(body, syn.rec)[0]
+        columns = [
+            expand_runs(iter_segment(body, s, e, syn, escaped), syn)
+            for s, e in segment_bounds(body, start + 1, syn, escaped)
+        ]
+        return transpose(columns, n), escaped
+
+    if escaped:
+        segments = iter_cells(body, start + 1, syn)
+    else:
+        segments = (row.split(syn.pair) for row in iter_rows(body, syn.rec))
+
+    if layout == "ref":
+        targets = {int(i) for i in syn.ref.findall(body, start)}
+        return expand_refs(segments, targets), escaped
+
+    return segments, escaped
+
+
+def parse_shared(meta: str):
+    """
+    Payload-level aliases as {column key: {alias: value}}, where the key
+    None applies to every column. META&SHARED=S1:v;S2:w is global;
+    META&DICT=<id> names a trained per-column dictionary, resolved from
+    the registered ones.
+    """
+    if meta.startswith("META&DICT="):
+        return resolve_dictionary(meta[len("META&DICT="):]).aliases()
+
+    _, _, entries = meta.partition("SHARED=")
+    out = {}
+    for e in entries.split(";"):
+        tok, val = e.split(":", 1)
+        out[tok] = val
+    return {None: out}
+
+
+def iter_decode_table(meta: str, body: str, types: dict | None = None,
+                      shared: dict | None = None):
+    """
+    Yield typed records one at a time. Row-major bodies are scanned
+    lazily, so time to first record does not depend on table size.
+    Column-major bodies first take one scan for segment boundaries and
+    back-referenced bodies one regex pass for their targets (whose rows
+    are then kept). Log tables yield their strings. `shared` is
+    the payload-level dictionary, if the payload has one.
+    """
+    spec = parse_meta(meta)
+    keys, vmap = spec["keys"], spec["vmap"]
+    col_types = (types or {}).get(spec["tid"], {})
+    syn = syntax(spec["delims"])
+
+    if spec["templates"] is not None:
+        yield from iter_decode_templates(spec, body, col_types)
+        return
+    body_keys = parse_header(body, syn.rec)[1]
+    pos = {k: i for i, k in enumerate(body_keys)}
+
+    # per column: (key, type, body position or None, codec decoder or None,
+    # alias lookup)
+    plan = []
+    for k in keys:
+        codec = spec["codecs"].get(k)
+        lookup = spec["cmaps"].get(k, vmap)
+        if shared:
+            extra = shared.get(k, shared.get(None))
+            if extra:
+                lookup = {**extra, **lookup}
+        plan.append((
+            k,
+            col_types.get(k, "str"),
+            pos.get(k),
+            column_decoder(*codec) if codec else None,
+            lookup,
+        ))
+
+    # substring dictionary: unescape + expand ~x markers in one pass
+    expand = (
+        fragment_decoder(spec["fragments"], syn.esc) if spec["fragments"] else None
+    )
 
     # 🔑 LOG AUTO-FLATTEN (single-column categorical table)
-    if list(col_types.keys()) == ["msg"]:
-        return [r["msg"] for r in records]
+    flatten = [k for k in col_types if k != CODEC_KEY] == ["msg"]
 
-    return records
+    rows, escaped = iter_raw_rows(body, spec["layout"], syn)
+    for vals in rows:
+        rec = {}
+        for k, t, i, codec, lookup in plan:
+            raw = vals[i] if i is not None and i < len(vals) else ""
+            if codec is not None:
+                val = codec(raw if i is not None else None)
+            else:
+                val = lookup.get(raw)
+                if val is None:
+                    if expand is not None:
+                        val = expand(raw)
+                    else:
+                        val = syn.unesc(raw) if escaped else raw
+            rec[k] = restore_type(val, t)
+        yield rec["msg"] if flatten else rec
+
+
+def iter_decode_templates(spec: dict, body: str, col_types: dict):
+    """Template-mined logs: each row is (template index, params...)."""
+    templates = spec["templates"]
+    flatten = list(col_types) == ["msg"]
+
+    rows, escaped = iter_raw_rows(body)
+    for cells in rows:
+        params = [unesc(c) for c in cells[1:]] if escaped else cells[1:]
+        line = fill_slots(templates[int(cells[0])], params)
+        yield line if flatten else {"msg": line}
+
+
+def decode_table(meta: str, body: str, types: dict, shared: dict | None = None):
+    return list(iter_decode_table(meta, body, types, shared))
 
 # ---------------- RECURSIVE DECODER ----------------
 
-def decode_any(obj, types):
+def is_table(obj):
+    return isinstance(obj, dict) and "meta" in obj and "body" in obj
+
+def decode_any(obj, types, shared=None):
     if isinstance(obj, dict):
-        if "meta" in obj and "body" in obj:
-            return decode_table(obj["meta"], obj["body"], types)
-        return {k: decode_any(v, types) for k, v in obj.items()}
+        if is_table(obj):
+            return decode_table(obj["meta"], obj["body"], types, shared)
+        return {k: decode_any(v, types, shared) for k, v in obj.items()}
 
     if isinstance(obj, list):
-        return [decode_any(x, types) for x in obj]
+        return [decode_any(x, types, shared) for x in obj]
 
     return obj
 
+# ---------------- DECODER SESSION ----------------
+
+class Decoder:
+    """Decoding session bound to one type registry (no shared state)."""
+
+    def __init__(self, types: dict):
+        self.types = types
+        self.shared = None   # payload-level dictionary, set by unwrap()
+
+    def unwrap(self, payload):
+        """Strip the shared-dictionary wrapper (if the registry says there is one)."""
+        if SHARED_KEY in self.types:
+            self.shared = parse_shared(payload["meta"])
+            return payload["data"]
+        return payload
+
+    def decode_table(self, meta: str, body: str):
+        return decode_table(meta, body, self.types, self.shared)
+
+    def iter_decode(self, payload):
+        """
+        Yield the records of a top-level table, array or streamed chunk
+        list one at a time.
+        """
+        payload = self.unwrap(payload)
+        if is_table(payload):
+            yield from iter_decode_table(
+                payload["meta"], payload["body"], self.types, self.shared
+            )
+        elif isinstance(payload, list):
+            for item in payload:
+                yield from self.iter_item(item)
+        else:
+            raise ValueError("Streaming decode needs a top-level table or array")
+
+    def iter_item(self, item):
+        """Records from one item of a top-level array (a chunk if streamed)."""
+        if STREAM_KEY not in self.types:
+            yield decode_any(item, self.types, self.shared)
+        elif is_table(item):
+            yield from iter_decode_table(
+                item["meta"], item["body"], self.types, self.shared
+            )
+        else:
+            yield from decode_any(item, self.types, self.shared)
+
+    def decode(self, payload):
+        payload = self.unwrap(payload)
+        if STREAM_KEY in self.types and isinstance(payload, list):
+            # streamed output: one encoded chunk per item -> flat array
+            return [
+                r for chunk in payload
+                for r in decode_any(chunk, self.types, self.shared)
+            ]
+        return decode_any(payload, self.types, self.shared)
+
 # ---------------- ENTRY POINT ----------------
 
-def decode(payload):
-    with open(TYPE_FILE, "r", encoding="utf-8") as f:
-        types = json.load(f)
+def decode(payload, store=None):
+    types = (store or file_store(TYPE_FILE)).load()
 
-    return decode_any(deepcopy(payload), types)
+    return Decoder(types).decode(payload)
@@ -0,0 +1,153 @@
+# dictionary.py — Trained COIL dictionaries reused across payloads
+# Learned once from sample payloads, then applied without running the
+# per-table optimizers; encoded payloads carry only the dictionary id:
+#   {"meta": "META&DICT=coil-3f9a0c1e2b7d", "data": ...}
+# Entries are per column, like CMAP: each column key gets its own
+# one-character aliases a, b, ... so cells stay as short as possible.
+# The decoder resolves the id from the dictionaries it has been given.
+
+import hashlib
+import json
+import threading
+from collections import Counter, defaultdict
+
+from .enc import (
+    Encoder, build_table, collect_keys, COLUMN_ALIASES, META_UNSAFE, PAIR,
+)
+from .colcodec import meta_key_safe
+
+FORMAT = "coil-dictionary"
+VERSION = 2
+MAX_ENTRIES = 4096
+
+
+class TrainedDictionary:
+    """A versioned per-column dictionary: {key: [values]} plus its content id."""
+
+    def __init__(self, columns: dict, model: str | None = None):
+        self.columns = columns
+        self.model = model
+        digest = hashlib.sha256(
+            json.dumps(list(columns.items()), ensure_ascii=False).encode("utf-8")
+        ).hexdigest()
+        self.id = f"coil-{digest[:12]}"
+        # {key: {value: alias}}, the encoder's view
+        self.values = {
+            k: dict(zip(vals, COLUMN_ALIASES)) for k, vals in columns.items()
+        }
+
+    def __len__(self):
+        return sum(len(vals) for vals in self.columns.values())
+
+    def aliases(self) -> dict:
+        """{key: {alias: value}}, the decoder's view."""
+        return {
+            k: dict(zip(COLUMN_ALIASES, vals)) for k, vals in self.columns.items()
+        }
+
+    def render(self) -> str:
+        """Dictionary text to put in a prompt once per conversation."""
+        return f"META&DICT={self.id}&CMAP=" + ";".join(
+            f"{k}:{PAIR.join(vals)}" for k, vals in self.columns.items()
+        )
+
+    def to_json(self) -> dict:
+        return {
+            "format": FORMAT,
+            "version": VERSION,
+            "id": self.id,
+            "model": self.model,
+            "columns": self.columns,
+        }
+
+    @classmethod
+    def from_json(cls, data: dict):
+        if data.get("format") != FORMAT:
+            raise ValueError("Not a COIL dictionary")
+        if data.get("version") != VERSION:
+            raise ValueError(f"Unsupported dictionary version: {data.get('version')}")
+        d = cls(data["columns"], data.get("model"))
+        if d.id != data["id"]:
+            raise ValueError(f"Dictionary {data['id']} does not match its entries")
+        return d
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_json(), f, indent=2, ensure_ascii=False)
+        return path
+
+# ---------------- TRAINING ----------------
+
+def train_dictionary(samples, model: str | None = None,
+                     max_entries: int = MAX_ENTRIES) -> TrainedDictionary:
+    """
+    Learn per-column dictionaries from sample payloads: for every column
+    key, the values whose one-character alias saves the most over all
+    the samples' tables, kept while the alias pays for its entry.
+    """
+    session = Encoder(model)
+    tk = session.backend
+    alias_cost = tk.measure("a")
+
+    freq = defaultdict(Counter)
+    for payload in samples:
+        for records in session.iter_tables(payload):
+            for col in build_table(records, collect_keys(records)).columns:
+                if meta_key_safe(col.key):
+                    counts = col.counts.copy()
+                    if col.nulls:
+                        counts["None"] -= col.nulls
+                    freq[col.key].update(+counts)
+
+    scored = []   # (gain, key, value)
+    for key, counts in freq.items():
+        candidates = [
+            v for v, c in counts.items()
+            if c >= 2 and v and not META_UNSAFE & set(v) and PAIR not in v
+        ]
+        costs = tk.measure_many(candidates)
+        gains = sorted(
+            (
+                (counts[v] * (cost - alias_cost) - tk.measure(f"{PAIR}{v}"), v)
+                for v, cost in zip(candidates, costs)
+            ),
+            reverse=True,
+        )
+        scored += [
+            (gain, key, v) for gain, v in gains[:len(COLUMN_ALIASES)] if gain > 0
+        ]
+
+    columns = defaultdict(list)
+    for _, key, v in sorted(scored, key=lambda e: e[0], reverse=True)[:max_entries]:
+        columns[key].append(v)
+
+    d = TrainedDictionary(dict(columns), tk.name)
+    register(d)
+    return d
+
+# ---------------- REGISTRY (decoder lookup by id) ----------------
+
+_registry = {}
+_lock = threading.Lock()
+
+
+def register(d: TrainedDictionary) -> TrainedDictionary:
+    with _lock:
+        _registry[d.id] = d
+    return d
+
+
+def resolve(dict_id: str) -> TrainedDictionary:
+    with _lock:
+        d = _registry.get(dict_id)
+    if d is None:
+        raise LookupError(
+            f"Unknown dictionary {dict_id!r}; load or register it before decoding"
+        )
+    return d
+
+
+def load_dictionary(path: str) -> TrainedDictionary:
+    """Load a saved dictionary and register it for decoding."""
+    with open(path, "r", encoding="utf-8") as f:
+        return register(TrainedDictionary.from_json(json.load(f)))
@@ -2,37 +2,113 @@
 # Iterative token-optimal, nested COIL blocks
 # Type info stored locally (NOT sent to LLM)
 
+import heapq
 import json
+import string
 from collections import Counter
-from copy import deepcopy
+from itertools import groupby
+from operator import itemgetter
 
 ESC = "\\"
 PAIR = ","
 REC = "|"
+RUN = "*"      # column-major run-length marker
+REF = "^"      # row back-reference marker (LAYOUT=ref)
 
 TYPE_FILE = "coil_types.json"
-
-TABLE_SEQ = 0
-TYPE_REGISTRY = {}
+SHARED_KEY = "__shared__"   # registry flag: payload wrapped with a shared dictionary
+META_UNSAFE = {"&", ";"}   # would split a meta entry; such values stay in the body
 
 # ---------------- TOKEN COUNT ----------------
 
-try:
-    import tiktoken
-    ENC = tiktoken.encoding_for_model("gpt-4o-mini")
-    def token_count(s): return len(ENC.encode(s))
-except Exception:
-    def token_count(s): return max(1, (len(s) + 3) // 4)
+from . import tokenizer
+from .store import file_store
+from .ir import TableIR
+from .colcodec import choose_codecs, codec_meta, meta_key_safe, CODEC_KEY
+from .templates import mine_templates, template_meta
+from .fragments import (
+    MARK, mine_fragments, fragment_pattern, apply_fragments, fragment_meta,
+)
 
 # ---------------- ESCAPE ----------------
 
+class Delims:
+    """
+    Escape, pair and record characters of one table body, with the
+    escaping that goes with them. Non-default sets are named in meta
+    as DELIM=<esc><pair><rec>.
+    """
+
+    def __init__(self, esc: str, pair: str, rec: str):
+        self.esc, self.pair, self.rec = esc, pair, rec
+        self.code = esc + pair + rec
+        self.special = (esc, pair, rec)
+        self._table = str.maketrans({c: esc + c for c in self.special})
+
+    def escape(self, v: str) -> str:
+        return v.translate(self._table)  # single pass over v
+
+    def escape_fragment(self, v: str) -> str:
+        """Escape a literal piece while a substring dictionary is active."""
+        return self.escape(v).replace(MARK, self.esc + MARK)
+
+    def escape_column(self, col):
+        """
+        Escape one column of strings. The column is scanned once for
+        special characters; clean columns are returned as-is.
+        """
+        joined = "".join(col)
+        if not any(c in joined for c in self.special):
+            return col
+        return [v.translate(self._table) for v in col]
+
+
+DEFAULT_DELIMS = Delims(ESC, PAIR, REC)
+
+# candidate sets: all printable, none special inside a JSON string
+DELIM_CANDIDATES = [DEFAULT_DELIMS] + [
+    Delims(e, p, r)
+    for e in (ESC, "`")
+    for p in (PAIR, ";")
+    for r in (REC, "#")
+    if (e, p, r) != DEFAULT_DELIMS.special
+]
+
 def esc(v: str) -> str:
-    return (
-        v.replace(ESC, ESC + ESC)
-         .replace(PAIR, ESC + PAIR)
-         .replace(REC, ESC + REC)
-         .replace(":", ESC + ":")
-    )
+    return DEFAULT_DELIMS.escape(v)
+
+def build_table(records, keys, delims: Delims = DEFAULT_DELIMS, values=None):
+    """Columnar IR of a table: stringified, escaped columns plus stats."""
+    return TableIR(records, keys, delims.escape_column, values)
+
+def choose_delims(table, backend=None):
+    """
+    Delimiter set whose escapes cost the fewest tokens for this table,
+    measured as the cells would appear inside a JSON string (where a
+    backslash doubles). Other sets pay for their &DELIM= meta entry;
+    the default is kept unless one wins net of that.
+    """
+    if not any(col.needs_escape for col in table.columns):
+        return DEFAULT_DELIMS
+
+    tk = backend or tokenizer.backend()
+    chars = set("".join(d.code for d in DELIM_CANDIDATES))
+    dirty = Counter()
+    for col in table.columns:
+        dirty.update(v for v in col.raw if not chars.isdisjoint(v))
+    values = list(dirty)
+
+    best, best_cost = DEFAULT_DELIMS, None
+    for d in DELIM_CANDIDATES:
+        costs = tk.measure_many(
+            json.dumps(d.escape(v), ensure_ascii=False) for v in values
+        )
+        cost = sum(dirty[v] * c for v, c in zip(values, costs))
+        if d is not DEFAULT_DELIMS:
+            cost += tk.measure(f"&DELIM={d.code}")
+        if best_cost is None or cost < best_cost:
+            best, best_cost = d, cost
+    return best
 
 # ---------------- DETECTION ----------------
 
@@ -47,147 +123,645 @@ def is_categorical_strings(arr):
         and len(set(arr)) <= len(arr) * 0.7
     )
 
+def is_log_lines(arr):
+    """Distinct free-text lines: left to template mining (cost-gated)."""
+    return (
+        isinstance(arr, list)
+        and len(arr) >= 2
+        and all(isinstance(x, str) for x in arr)
+        and any(" " in x for x in arr)
+    )
+
 def collect_keys(records):
     keys = set()
     for r in records:
         keys.update(r.keys())
     return sorted(keys)
 
-# ---------------- ITERATIVE VMAP OPTIMIZER ----------------
+# ---------------- TABLE SHAPES ----------------
+
+class TableShape:
+    """
+    What one table of a sample payload says about same-shaped tables
+    (see plan.compile_plan): key order, column types and a column
+    extractor. Only shape-derived work is cached; delimiters, codecs,
+    dictionaries, layout and the auto-skip gate are still decided on
+    each table's own data.
+    """
+
+    __slots__ = ("keys", "keyset", "dense", "getter", "types")
+
+    def __init__(self, table):
+        records, keys = table.records, table.keys
+        self.keys = keys
+        self.keyset = frozenset(keys)
+        # every record carries every key: columns come from one itemgetter
+        self.dense = all(len(r) == len(keys) for r in records)
+        self.getter = itemgetter(*keys) if self.dense and keys else None
+        self.types = table.types()
+
+    def fits(self, records):
+        """Same keys as the sample (and as dense), so the shape replays."""
+        if not is_table(records):
+            return False
+        keyset = self.keyset
+        if self.dense:
+            return all(r.keys() == keyset for r in records)
+        seen = set()
+        for r in records:
+            if not keyset.issuperset(r):
+                return False
+            seen.update(r)
+        return len(seen) == len(keyset)
+
+    def columns(self, records):
+        """Per-key value lists of fitting records (None: look keys up)."""
+        if self.getter is None:
+            return None
+        if len(self.keys) == 1:
+            return [list(map(self.getter, records))]
+        return [list(vals) for vals in zip(*map(self.getter, records))]
 
-def greedy_vmap(records, keys):
-    flat_vals = []
-    for r in records:
-        for k in keys:
-            v = r.get(k, "")
-            if v is not None:
-                flat_vals.append(str(v))
+# ---------------- ITERATIVE VMAP OPTIMIZER ----------------
 
-    freq = Counter(flat_vals)
+def greedy_vmap(records, keys, stats=None, backend=None, table=None, exclude=()):
+    """
+    Greedy value dictionary: each round accepts the alias with the
+    largest token gain until no alias pays for itself.
+
+    Gains are evaluated as deltas instead of re-rendering the table:
+    an alias V<n> for value v changes the encoding by
+        occ(v) * (cost(esc(v)) - cost(V<n>)) - cost(meta entry)
+    so per-value costs are measured once and each round is arithmetic.
+
+    Candidates sit in a lazy-greedy (CELF) heap keyed by their last
+    delta. Alias numbers only grow, so a delta from an earlier round is
+    a lower bound and only the top of the heap needs re-evaluation.
+    If `stats` is given it receives the evaluation/skip counts.
+    Costs come from `backend` (the active tokenizer backend if None);
+    `table` is the columnar IR, built here if not given. Values in
+    `exclude` (already aliased elsewhere) are never candidates.
+    """
+    tk = backend or tokenizer.backend()
+    table = table or build_table(records, keys)
+
+    freq = table.value_freq()
     candidates = sorted(
-        [v for v, c in freq.items() if c >= 2],
+        [
+            v for v, c in freq.items()
+            if c >= 2 and not META_UNSAFE & set(v) and v not in exclude
+        ],
         key=lambda v: freq[v] * len(v),
         reverse=True
     )
+    if not candidates:
+        return {}
+
+    # cells as rendered (None -> "None"), counted once
+    cells = table.cell_counts()
+    escaped = table.escaped_map()
+    occ = {v: cells[v] for v in candidates}
+    lit_cost = dict(zip(
+        candidates, tk.measure_many(escaped.get(v, v) for v in candidates)
+    ))
+
+    rows = [PAIR.join(row) for row in zip(*(c.escaped for c in table.columns))]
+    body = REC.join(
+        [f"table[{len(records)}]{{{','.join(keys)}}}"] + rows
+    )
+    total = (
+        tk.measure(f"META&ORDER={','.join(keys)}&vmap=")
+        + tk.measure("|" + body)
+    )
+    sep_cost = tk.measure(";")
 
-    accepted = {}
-    baseline = token_count(json.dumps(records, ensure_ascii=False))
-
-    while True:
-        best_gain = 0
-        best_val = None
-        best_tok = None
-
-        for val in candidates:
-            if val in accepted:
-                continue
-
-            tok = f"V{len(accepted)+1}"
-            test_map = accepted | {val: tok}
-
-            rows = []
-            for r in records:
-                row = []
-                for k in keys:
-                    v = str(r.get(k, ""))
-                    row.append(test_map.get(v, esc(v)))
-                rows.append(PAIR.join(row))
-
-            body = REC.join(
-                [f"table[{len(records)}]{{{','.join(keys)}}}"] + rows
-            )
-            meta = f"META&ORDER={','.join(keys)}&vmap=" + ";".join(
-                f"{t}:{v}" for v, t in test_map.items()
-            )
-
-            tokens = token_count(meta + "|" + body)
-            gain = baseline - tokens
-
-            if gain > best_gain:
-                best_gain = gain
-                best_val = val
-                best_tok = tok
+    def delta(val, tok, tok_cost, sep):
+        return (
+            sep + tk.measure(f"{tok}:{val}")
+            - occ[val] * (lit_cost[val] - tok_cost)
+        )
 
-        if best_gain > 0:
-            accepted[best_val] = best_tok
-            baseline -= best_gain
-        else:
+    accepted = {}
+    baseline = tk.count(table.json_text)
+
+    # heap entries: (delta, candidate index, round it was evaluated in)
+    tok_cost = tk.measure("V1")
+    heap = [
+        (delta(v, "V1", tok_cost, 0), i, 1)
+        for i, v in enumerate(candidates)
+    ]
+    heapq.heapify(heap)
+    evaluations = naive = len(candidates)
+    rnd = 1
+
+    while heap:
+        tok = f"V{rnd}"
+        tok_cost = tk.measure(tok)
+        sep = sep_cost if accepted else 0
+        if rnd > 1:
+            naive += len(heap)
+
+        def fresh(i):
+            return delta(candidates[i], tok, tok_cost, sep)
+
+        while heap[0][2] != rnd:
+            _, i, _ = heap[0]
+            heapq.heapreplace(heap, (fresh(i), i, rnd))
+            evaluations += 1
+
+        best_delta, best_i, _ = heapq.heappop(heap)
+        best_gain = baseline - tk.finish(total + best_delta)
+        if best_gain <= 0:
             break
 
-    return accepted
+        # equal token gains go to the earliest candidate
+        held = []
+        while heap and baseline - tk.finish(total + heap[0][0]) >= best_gain:
+            d, i, r = heapq.heappop(heap)
+            if r != rnd:
+                d = fresh(i)
+                evaluations += 1
+            if baseline - tk.finish(total + d) == best_gain and i < best_i:
+                held.append((best_delta, best_i, rnd))
+                best_delta, best_i = d, i
+            else:
+                held.append((d, i, rnd))
+        for e in held:
+            heapq.heappush(heap, e)
+
+        accepted[candidates[best_i]] = tok
+        baseline -= best_gain
+        total += best_delta
+        rnd += 1
+
+    if stats is not None:
+        stats["candidates"] = len(candidates)
+        stats["evaluations"] = evaluations
+        stats["skipped"] = naive - evaluations
 
-# ---------------- TABLE ENCODER ----------------
-
-def encode_table(records):
-    global TABLE_SEQ, TYPE_REGISTRY
-    TABLE_SEQ += 1
-    tid = f"tbl_{TABLE_SEQ}"
-
-    keys = collect_keys(records)
-    vmap = greedy_vmap(records, keys)
-
-    # Build encoded body
-    rows = []
-    for r in records:
-        row = []
-        for k in keys:
-            v = str(r.get(k, ""))
-            row.append(vmap.get(v, esc(v)))
-        rows.append(PAIR.join(row))
+    return accepted
 
-    body = REC.join(
-        [f"table[{len(records)}]{{{','.join(keys)}}}"] + rows
+def vmap_meta(vmap):
+    if not vmap:
+        return ""
+    return "&vmap=" + ";".join(f"{t}:{v}" for v, t in vmap.items())
+
+# ---------------- PER-COLUMN DICTIONARIES ----------------
+
+COLUMN_ALIASES = string.ascii_letters
+
+def column_vmaps(table, backend=None, exclude=()):
+    """
+    Per-column dictionaries. The decoder knows a cell's column from its
+    position, so every column reuses the one-character aliases a, b, ...
+    Values go in order of characters saved while the alias still pays
+    for its meta entry. Keys that cannot head a CMAP entry are left to
+    the global vmap. Returns {key: {value: alias}}.
+    """
+    tk = backend or tokenizer.backend()
+    alias_cost = tk.measure("a")
+    out = {}
+
+    for col in table.columns:
+        if not meta_key_safe(col.key):
+            continue
+        candidates = sorted(
+            [
+                v for v, c in col.counts.items()
+                if c >= 2
+                and v not in exclude
+                and not (v == "None" and col.nulls)
+                and not META_UNSAFE & set(v) and PAIR not in v
+            ],
+            key=lambda v: col.counts[v] * len(v),
+            reverse=True,
+        )
+        escaped = dict(zip(col.raw, col.escaped)) if col.needs_escape else {}
+        costs = tk.measure_many(escaped.get(v, v) for v in candidates)
+
+        aliases = {}
+        for v, cost in zip(candidates, costs):
+            if len(aliases) == len(COLUMN_ALIASES):
+                break
+            entry = f"{PAIR}{v}" if aliases else f";{col.key}:{v}"
+            gain = col.counts[v] * (cost - alias_cost) - tk.measure(entry)
+            if gain > 0:
+                aliases[v] = COLUMN_ALIASES[len(aliases)]
+        if aliases:
+            out[col.key] = aliases
+
+    return out
+
+def cmap_meta(cmaps):
+    """&CMAP=city:Bangalore,Chennai;status:OK,FAIL (alias = position)"""
+    return "&CMAP=" + ";".join(
+        f"{k}:{PAIR.join(aliases)}" for k, aliases in cmaps.items()
     )
 
-    meta = f"META&ORDER={','.join(keys)}&tid={tid}"
-    if vmap:
-        meta += "&vmap=" + ";".join(f"{t}:{v}" for v, t in vmap.items())
-
-    encoded_tokens = token_count(meta + "|" + body)
-    original_tokens = token_count(json.dumps(records, ensure_ascii=False))
+# ---------------- SHARED (PAYLOAD-LEVEL) DICTIONARY ----------------
+
+def shared_vmap(tables, backend=None):
+    """
+    One dictionary for values that recur across several tables of a
+    payload (cities, statuses, user ids). A value's gain counts its
+    occurrences in every table; aliases S1, S2, ... go by gain and are
+    kept while they pay for their entry. Returns {value: alias}.
+    """
+    tk = backend or tokenizer.backend()
+    freq = Counter()
+    spread = Counter()
+    for t in tables:
+        f = t.value_freq()
+        freq.update(f)
+        spread.update(f.keys())
 
-    if encoded_tokens >= original_tokens:
-        return records  # auto-skip
-
-    # Store types
-    TYPE_REGISTRY[tid] = {
-        k: type(next((r[k] for r in records if k in r), "")).__name__
-        for k in keys
-    }
+    candidates = sorted(
+        [
+            v for v, c in freq.items()
+            if c >= 2 and spread[v] >= 2 and not META_UNSAFE & set(v)
+        ],
+        key=lambda v: freq[v] * len(v),
+        reverse=True,
+    )
+    costs = tk.measure_many(esc(v) for v in candidates)
+
+    out = {}
+    for v, cost in zip(candidates, costs):
+        alias = f"S{len(out) + 1}"
+        gain = freq[v] * (cost - tk.measure(alias)) - tk.measure(f";{alias}:{v}")
+        if gain > 0:
+            out[v] = alias
+    return out
+
+def shared_meta(shared):
+    return "META&SHARED=" + ";".join(f"{t}:{v}" for v, t in shared.items())
+
+# ---------------- BODY LAYOUTS ----------------
+
+def render_rows(cols, delims: Delims = DEFAULT_DELIMS):
+    """Row-major: a,b,c|a,b,c"""
+    return [delims.pair.join(row) for row in zip(*cols)]
+
+def render_columns(cols, delims: Delims = DEFAULT_DELIMS):
+    """
+    Column-major with run-length markers: each segment is one column,
+    `v*k` stands for k consecutive copies of v. A literal * is escaped.
+    """
+    segments = []
+    for col in cols:
+        cells = []
+        for v, run in groupby(col):
+            if RUN in v:
+                v = v.replace(RUN, delims.esc + RUN)
+            k = sum(1 for _ in run)
+            rle = f"{v}{RUN}{k}"
+            if k > 1 and len(rle) < (len(v) + 1) * k - 1:
+                cells.append(rle)
+            else:
+                cells.extend([v] * k)
+        segments.append(delims.pair.join(cells))
+    return segments
+
+def render_refs(rows, delims: Delims = DEFAULT_DELIMS):
+    """
+    Row-major with back-references: a row equal to an earlier row i is
+    written `^i`, k consecutive copies `^i*k`. Rows that really start
+    with ^ are escaped.
+    """
+    out = []
+    first = {}
+    run = None  # (row index, copies) of the trailing reference
+    for n, row in enumerate(rows):
+        i = first.get(row)
+        if i is not None and run and run[0] == i:
+            run = (i, run[1] + 1)
+            out[-1] = f"{REF}{i}{RUN}{run[1]}"
+        elif i is not None and len(f"{REF}{i}") < len(row):
+            run = (i, 1)
+            out.append(f"{REF}{i}")
+        else:
+            first.setdefault(row, n)
+            run = None
+            out.append(delims.esc + row if row.startswith(REF) else row)
+    return out
+
+# ---------------- ENCODER SESSION ----------------
+
+class Encoder:
+    """
+    One encoding session: owns the table counter, the type registry and
+    the tokenizer choice (`model`, else whatever set_model made active
+    at call time). Sessions share nothing, so each thread (or
+    request) can run its own. With a trained `dictionary` (see
+    dictionary.train_dictionary) the per-table dictionary optimizers
+    are skipped and its per-column aliases are used instead. With a compiled
+    `plan` (see plan.compile_plan) payloads are walked by the plan
+    rather than by detection.
+    """
+
+    def __init__(self, model: str | None = None, dictionary=None, plan=None):
+        self.model = model
+        self.table_seq = 0
+        self.types = {}
+        self.shared = {}   # payload-level dictionary while encoding with one
+        self.dictionary = dictionary
+        self.plan = plan
+        self.shapes = None  # list collecting TableShapes while compiling a plan
+
+    @property
+    def backend(self):
+        """Tokenizer for `model`, or the active one (set_model) if None."""
+        return tokenizer.backend(self.model)
+
+    def reset(self):
+        self.table_seq = 0
+        self.types = {}
+
+    # ---------------- TABLE ENCODER ----------------
+
+    def encode_table(self, records, shape: TableShape | None = None):
+        """Encode a list of records; `shape` (from a compiled plan) skips key discovery."""
+        self.table_seq += 1
+        tid = f"tbl_{self.table_seq}"
+        tk = self.backend
+
+        if shape is None:
+            keys, values = collect_keys(records), None
+        else:
+            keys, values = shape.keys, shape.columns(records)
+        table = build_table(records, keys, values=values)
+        if self.shapes is not None:
+            self.shapes.append(TableShape(table))
+
+        # numeric / timestamp columns: delta, base+offset or step codecs
+        # (their cells are digits, so the delimiters do not matter yet)
+        def cells_cost(cells):  # cheaper of plain and run-length cells
+            return min(
+                tk.count(PAIR.join(cells)),
+                tk.count(render_columns([cells])[0]),
+            )
 
-    return {"meta": meta, "body": "BODY|" + body}
+        codecs = choose_codecs(table, tk.count, cells_cost)
+        plain_keys = [k for k in keys if k not in codecs]
+        body_keys = [k for k in keys if codecs.get(k, (None, []))[1] is not None]
+
+        # delimiters / escape char that make the remaining columns' escapes cheapest
+        delims = choose_delims(table.select(plain_keys), tk)
+        if delims is not DEFAULT_DELIMS:
+            table = build_table(records, keys, delims, values)
+
+        # Build encoded body; aliases: {key: {raw value: alias}}
+        def body_cols(aliases, rendered):
+            cols = []
+            for c in table.columns:
+                if c.key in codecs:
+                    if codecs[c.key][1] is not None:
+                        cols.append(codecs[c.key][1])
+                elif aliases or rendered:
+                    amap = aliases.get(c.key, {}) if aliases else {}
+                    taken = set(amap.values())
+                    col = []
+                    for v, e in zip(c.raw, c.escaped):
+                        cell = amap.get(v)
+                        if cell is None:
+                            cell = rendered.get(v, e) if rendered else e
+                            if cell in taken:  # literal that looks like an alias
+                                cell = delims.esc + cell
+                        col.append(cell)
+                    cols.append(col)
+                else:
+                    cols.append(c.escaped)
+            return cols
+
+        plain_table = table.select(plain_keys)
+        shared = self.shared
+        optimize = self.dictionary is None
+        vmap = greedy_vmap(
+            records, plain_keys, backend=tk, table=plain_table, exclude=shared
+        ) if optimize else {}
+        cmaps = column_vmaps(plain_table, backend=tk, exclude=shared) if optimize else {}
+
+        # one global V1.. dictionary or per-column a, b, ...: cheaper wins
+        header = f"table[{len(records)}]{{{','.join(body_keys)}}}"
+        aliases = {k: vmap for k in plain_keys} if vmap else {}
+        dictionary = vmap_meta(vmap)
+        if cmaps:
+            def dict_cost(aliases, meta):
+                rows = render_rows(body_cols(aliases, None), delims)
+                return tk.count(meta + "|" + delims.rec.join([header] + rows))
+            if dict_cost(cmaps, cmap_meta(cmaps)) < dict_cost(aliases, dictionary):
+                aliases, dictionary = cmaps, cmap_meta(cmaps)
+
+        # shared aliases apply in every variant (their dictionary is payload-level)
+        base = {k: shared for k in plain_keys} if shared else None
+        if shared:
+            aliases = {k: {**shared, **aliases.get(k, {})} for k in plain_keys}
+        if not optimize:
+            # trained per-column aliases, which the decoder applies everywhere
+            trained = self.dictionary.values
+            base = aliases = {k: trained[k] for k in plain_keys if k in trained}
+
+        # substring dictionary over the string cells left un-aliased
+        literal = Counter()
+        for c in table.columns:
+            if c.key not in codecs and c.type == "str":
+                amap = aliases.get(c.key, {})
+                literal.update(v for v in c.raw if v not in amap)
+        frags = (
+            mine_fragments(literal, tk, delims.escape_fragment)
+            if literal and optimize else {}
+        )
+
+        rendered = {}
+        if frags:
+            pattern = fragment_pattern(frags)
+            for c in table.columns:
+                if c.key not in codecs:
+                    for v in c.counts:
+                        if v not in rendered:
+                            rendered[v] = apply_fragments(
+                                v, frags, pattern, delims.escape_fragment
+                            )
+
+        plain = body_cols(base, None)
+        cols = body_cols(aliases, rendered) if (aliases or rendered) else plain
+
+        codec_spec = f"&CODEC={codec_meta(codecs)}" if codecs else ""
+        if frags:
+            dictionary = f"&FRAG={fragment_meta(frags)}" + dictionary
+
+        # pick row- or column-major by token cost; runs may make the
+        # dictionaries redundant in column-major. Duplicate rows may
+        # collapse into back-references.
+        rows = render_rows(cols, delims)
+        variants = [
+            ("row", rows, dictionary),
+            ("col", render_columns(cols, delims), dictionary),
+        ]
+        if body_keys and len(set(rows)) < len(rows):
+            variants.append(("ref", render_refs(rows, delims), dictionary))
+        if dictionary:
+            variants.append(("col", render_columns(plain, delims), ""))
+
+        best = None
+        for layout, segments, dict_meta in variants:
+            meta = f"META&ORDER={','.join(keys)}&tid={tid}"
+            if layout != "row":
+                meta += f"&LAYOUT={layout}"
+            if delims is not DEFAULT_DELIMS:
+                meta += f"&DELIM={delims.code}"
+            meta += codec_spec + dict_meta
+            body = delims.rec.join([header] + segments)
+
+            tokens = tk.count(meta + "|" + body)
+            if best is None or tokens < best[0]:
+                best = (tokens, meta, body)
+
+        encoded_tokens, meta, body = best
+        original_tokens = tk.count(table.json_text)
+
+        if encoded_tokens >= original_tokens:
+            return records  # auto-skip
+
+        # Store types (+ which codec each coded column uses)
+        self.types[tid] = table.types()
+        if codecs:
+            self.types[tid][CODEC_KEY] = {
+                k: spec[:spec.index("(")] for k, (spec, _) in codecs.items()
+            }
+
+        return {"meta": meta, "body": "BODY|" + body}
+
+    # ---------------- LOG ENCODER (1-COLUMN TABLE) ----------------
+
+    def encode_logs(self, logs, shape: TableShape | None = None):
+        records = [{"msg": s} for s in logs]
+        out = self.encode_table(records, shape)
+        tid = f"tbl_{self.table_seq}"
+
+        # template mode: (template, params...) rows, kept if cheaper
+        tk = self.backend
+        if out is records:
+            best = tk.count(json.dumps(logs, ensure_ascii=False))
+        else:
+            best = tk.count(out["meta"] + "|" + out["body"])
+
+        templated = self.encode_templates(logs, tid)
+        if tk.count(templated["meta"] + "|" + templated["body"]) < best:
+            self.types[tid] = {"msg": "str"}
+            return templated
+
+        return logs if out is records else out  # auto-skip keeps the list
+
+    def encode_templates(self, logs, tid):
+        templates, rows = mine_templates(logs)
+        body = REC.join(
+            [f"table[{len(logs)}]{{msg}}"]
+            + [PAIR.join([str(t)] + [esc(p) for p in params]) for t, params in rows]
+        )
+        meta = f"META&ORDER=msg&tid={tid}&TPL={template_meta(templates)}"
+        return {"meta": meta, "body": "BODY|" + body}
+
+    # ---------------- RECURSIVE ENCODER ----------------
+
+    def encode_any(self, obj):
+        if isinstance(obj, list) and is_table(obj):
+            return self.encode_table(obj)
+
+        if isinstance(obj, list) and (is_categorical_strings(obj) or is_log_lines(obj)):
+            return self.encode_logs(obj)
+
+        if isinstance(obj, dict):
+            return {k: self.encode_any(v) for k, v in obj.items()}
+
+        if isinstance(obj, list):
+            return [self.encode_any(x) for x in obj]
+
+        return obj
+
+    def iter_tables(self, obj):
+        """Records of every table encode_any would encode, in order."""
+        if isinstance(obj, list) and is_table(obj):
+            yield obj
+        elif isinstance(obj, list) and (is_categorical_strings(obj) or is_log_lines(obj)):
+            yield [{"msg": s} for s in obj]
+        elif isinstance(obj, dict):
+            for v in obj.values():
+                yield from self.iter_tables(v)
+        elif isinstance(obj, list):
+            for x in obj:
+                yield from self.iter_tables(x)
+
+    def encode_root(self, payload):
+        if self.plan is None:
+            return self.encode_any(payload)
+        return self.plan.root.encode(self, payload)
+
+    def encode(self, payload, shared: bool = False):
+        """
+        Encode `payload`; its type registry is left in `self.types`.
+        With `shared`, values recurring across tables may go into one
+        payload-level dictionary: the result is then
+        {"meta": "META&SHARED=S1:...", "data": encoded payload}, kept only
+        if it costs fewer tokens.
+        """
+        self.reset()
+
+        if self.dictionary is not None:
+            return self.encode_trained(payload)
+
+        # encode_any builds fresh containers; leaves and auto-skipped tables
+        # are shared with the input, which is never mutated
+        encoded = self.encode_root(payload)
+        if not shared:
+            return encoded
+
+        tables = [build_table(r, collect_keys(r)) for r in self.iter_tables(payload)]
+        dictionary = shared_vmap(tables, self.backend) if len(tables) >= 2 else {}
+        if not dictionary:
+            return encoded
+
+        types = self.types
+        self.reset()
+        self.shared = dictionary
+        try:
+            wrapped = {"meta": shared_meta(dictionary), "data": self.encode_root(payload)}
+        finally:
+            self.shared = {}
+
+        tk = self.backend
+        if tk.count(json.dumps(wrapped, ensure_ascii=False)) < tk.count(
+            json.dumps(encoded, ensure_ascii=False)
+        ):
+            self.types[SHARED_KEY] = True
+            return wrapped
+
+        self.types = types
+        return encoded
+
+    def encode_trained(self, payload):
+        """Encode with the trained dictionary; the payload carries only its id."""
+        data = self.encode_root(payload)
+        self.types[SHARED_KEY] = True
+        return {"meta": f"META&DICT={self.dictionary.id}", "data": data}
+
+# ---------------- MODULE API (thin wrappers) ----------------
+# A fresh session per call: the active tokenizer (set_model) applies and
+# no table ids or registry entries carry over between calls.
 
-# ---------------- LOG ENCODER (1-COLUMN TABLE) ----------------
+def encode_table(records):
+    return Encoder().encode_table(records)
 
 def encode_logs(logs):
-    records = [{"msg": s} for s in logs]
-    return encode_table(records)
-
-# ---------------- RECURSIVE ENCODER ----------------
+    return Encoder().encode_logs(logs)
 
 def encode_any(obj):
-    if isinstance(obj, list) and is_table(obj):
-        return encode_table(obj)
-
-    if isinstance(obj, list) and is_categorical_strings(obj):
-        return encode_logs(obj)
-
-    if isinstance(obj, dict):
-        return {k: encode_any(v) for k, v in obj.items()}
-
-    if isinstance(obj, list):
-        return [encode_any(x) for x in obj]
-
-    return obj
-
-def encode(payload):
-    global TYPE_REGISTRY, TABLE_SEQ
-    TYPE_REGISTRY = {}
-    TABLE_SEQ = 0
+    return Encoder().encode_any(obj)
 
-    result = encode_any(deepcopy(payload))
+def encode(payload, store=None, shared=False, dictionary=None):
+    session = Encoder(dictionary=dictionary)
+    result = session.encode(payload, shared=shared)
 
-    with open(TYPE_FILE, "w", encoding="utf-8") as f:
-        json.dump(TYPE_REGISTRY, f, indent=2)
+    (store or file_store(TYPE_FILE)).save(session.types)
 
     return result
@@ -0,0 +1,129 @@
+# fragments.py — Substring dictionary for COIL tables
+# Frequent fragments inside values (log prefixes, hosts, paths) become
+# ~x markers; each is accepted only if the tokenizer says it pays off
+#   FRAG=a:INFO: ;b:/var/log/app/        (cell: "~asession started")
+
+import re
+import string
+from collections import Counter
+
+MARK = "~"                 # literal ~ is escaped while FRAG is active
+ALIASES = string.ascii_letters + string.digits
+
+MIN_LEN = 4                # shorter fragments never beat a 2-char marker
+MAX_SPAN = 64
+MAX_CANDIDATES = 256
+
+_WORD = re.compile(r"\S+\s*")
+_BOUNDARY = set(" \t:/.=-_,")
+_UNSAFE = set("&;\r\n")    # cannot appear in a meta entry
+
+# ---------------- ENCODER SIDE ----------------
+
+def fragment_candidates(freq):
+    """
+    Substrings that start at a word and end at a separator, weighted by
+    how often they occur. Ranked by characters saved.
+    """
+    occ = Counter()
+    for v, c in freq.items():
+        seen = set()
+        n = len(v)
+        for m in _WORD.finditer(v):
+            i = m.start()
+            for j in range(i + MIN_LEN, min(n, i + MAX_SPAN) + 1):
+                if j == n or v[j - 1] in _BOUNDARY:
+                    seen.add(v[i:j])
+        for s in seen:
+            occ[s] += c
+
+    cands = [
+        s for s, c in occ.items()
+        if c >= 2 and not any(ch in _UNSAFE for ch in s)
+    ]
+    cands.sort(key=lambda s: occ[s] * (len(s) - 2), reverse=True)
+    return cands[:MAX_CANDIDATES]
+
+
+def fragment_pattern(frags):
+    """One alternation, longest fragment first (leftmost-longest split)."""
+    alts = sorted(frags, key=len, reverse=True)
+    return re.compile("(" + "|".join(map(re.escape, alts)) + ")")
+
+
+def apply_fragments(v, frags, pattern, escape):
+    """Render `v` with fragments as ~x markers and the rest escaped."""
+    parts = pattern.split(v)
+    return "".join(
+        MARK + frags[p] if i % 2 else escape(p)
+        for i, p in enumerate(parts)
+    )
+
+
+def mine_fragments(freq, tk, escape):
+    """
+    Greedy substring dictionary over `freq` ({raw value: occurrences}).
+    Each candidate is tried in rank order; it is kept only if the cells
+    it touches plus its meta entry measure fewer tokens under `tk`.
+    Returns {fragment: alias}.
+    """
+    accepted = {}
+    pattern = None
+
+    for frag in fragment_candidates(freq):
+        if len(accepted) == len(ALIASES):
+            break
+        hits = [v for v in freq if frag in v]
+        if sum(freq[v] for v in hits) < 2:
+            continue
+
+        alias = ALIASES[len(accepted)]
+        trial = {**accepted, frag: alias}
+        trial_pattern = fragment_pattern(trial)
+
+        before = tk.measure_many(
+            apply_fragments(v, accepted, pattern, escape) if pattern else escape(v)
+            for v in hits
+        )
+        after = tk.measure_many(
+            apply_fragments(v, trial, trial_pattern, escape) for v in hits
+        )
+        entry = f";{alias}:{frag}" if accepted else f"&FRAG={alias}:{frag}"
+        delta = tk.measure(entry) + sum(
+            freq[v] * (a - b) for v, a, b in zip(hits, after, before)
+        )
+        if delta < 0:
+            accepted, pattern = trial, trial_pattern
+
+    return accepted
+
+
+def fragment_meta(frags):
+    return ";".join(f"{a}:{s}" for s, a in frags.items())
+
+# ---------------- DECODER SIDE ----------------
+
+def parse_fragments(text):
+    """`a:frag;b:frag` -> {alias: fragment}"""
+    out = {}
+    for entry in text.split(";"):
+        alias, frag = entry.split(":", 1)
+        out[alias] = frag
+    return out
+
+
+def fragment_decoder(frags, esc="\\"):
+    """Unescape a raw cell and expand its ~x markers in one pass."""
+    # an escaped char (\x -> x) or a marker (~a -> fragment a)
+    pattern = re.compile(f"{re.escape(esc)}(.)|{re.escape(MARK)}(.)", re.S)
+
+    def sub(m):
+        lit = m.group(1)
+        return lit if lit is not None else frags[m.group(2)]
+
+    def expand(cell):
+        if esc not in cell and MARK not in cell:
+            return cell
+        return pattern.sub(sub, cell)
+
+    return expand
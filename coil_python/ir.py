@@ -0,0 +1,115 @@
+# ir.py — Columnar intermediate representation for COIL tables
+# Built once per table; every encoder phase reads from it
+# (vmap candidates, rendering, type inference, auto-skip)
+
+import json
+from collections import Counter
+from itertools import chain
+
+MISSING = object()   # key absent from a record
+
+
+class Column:
+    """
+    One table column: original values plus their stringified and
+    escaped forms, and per-column stats.
+    """
+
+    __slots__ = ("key", "values", "raw", "escaped", "counts", "nulls", "type")
+
+    def __init__(self, key, values, escape):
+        self.key = key
+        self.values = values
+
+        # as rendered: missing -> "", None -> "None"
+        self.raw = [
+            "" if v is MISSING else str(v)
+            for v in values
+        ]
+        self.escaped = escape(self.raw)
+        self.counts = Counter(self.raw)
+        self.nulls = sum(1 for v in values if v is None)
+
+        # declared type = first present value (the registry contract)
+        first = next((v for v in values if v is not MISSING), "")
+        self.type = type(first).__name__
+
+    @property
+    def n_rows(self):
+        return len(self.values)
+
+    @property
+    def cardinality(self):
+        return len(self.counts)
+
+    @property
+    def needs_escape(self):
+        return self.escaped is not self.raw
+
+
+class TableIR:
+    """
+    Column-major view of a list of records. `escape` maps a column of
+    raw strings to its escaped form (returning the same list if clean).
+    `values` (one list per key) skips the per-record key lookups.
+    """
+
+    def __init__(self, records, keys, escape, values=None):
+        self.records = records
+        self.keys = keys
+        self.n_rows = len(records)
+        if values is None:
+            values = ([r.get(k, MISSING) for r in records] for k in keys)
+        self.columns = [
+            Column(k, vals, escape)
+            for k, vals in zip(keys, values)
+        ]
+        self._json = None
+        self._cells = None
+
+    def select(self, keys):
+        """View over a subset of columns (same Column objects, same JSON)."""
+        view = TableIR.__new__(TableIR)
+        view.records = self.records
+        view.keys = list(keys)
+        view.n_rows = self.n_rows
+        by_key = {c.key: c for c in self.columns}
+        view.columns = [by_key[k] for k in view.keys]
+        view._json = self._json
+        view._cells = None
+        return view
+
+    @property
+    def json_text(self):
+        """Original records as JSON (the auto-skip / vmap baseline)."""
+        if self._json is None:
+            self._json = json.dumps(self.records, ensure_ascii=False)
+        return self._json
+
+    def cell_counts(self):
+        """Rendered-cell frequencies, in row-major first-seen order."""
+        if self._cells is None:
+            self._cells = Counter(
+                chain.from_iterable(zip(*(col.raw for col in self.columns)))
+            )
+        return self._cells
+
+    def value_freq(self):
+        """Non-null value frequencies across all columns (vmap candidates)."""
+        freq = self.cell_counts().copy()
+        nulls = sum(col.nulls for col in self.columns)
+        if nulls:
+            freq["None"] -= nulls
+        return +freq
+
+    def escaped_map(self):
+        """raw -> escaped for every cell that changes when escaped."""
+        out = {}
+        for col in self.columns:
+            if col.needs_escape:
+                out.update(zip(col.raw, col.escaped))
+        return out
+
+    def types(self):
+        return {col.key: col.type for col in self.columns}
+
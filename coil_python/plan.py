@@ -0,0 +1,153 @@
+# plan.py — Compiled COIL encoder plans for recurring payload shapes
+# compile_plan(sample) encodes the sample once and records, per path,
+# what is fixed by the shape: which nodes are tables or log lists, each
+# table's key order, column types and a column extractor for dense
+# records. plan.encode(payload) walks the payload
+# along the plan without detection or key discovery; everything that
+# depends on the data (delimiters, codecs, dictionaries, layout, the
+# auto-skip gate, templates) is still decided per payload. Any subtree
+# whose shape has drifted goes through the generic encode_any instead.
+
+from .enc import Encoder, TableShape, is_table, is_categorical_strings, is_log_lines
+from .prompt import path_label
+
+# ---------------- PLAN NODES ----------------
+
+class TableNode:
+    __slots__ = ("shape",)
+
+    def __init__(self, shape: TableShape):
+        self.shape = shape
+
+    def encode(self, session, obj):
+        if self.shape.fits(obj):
+            return session.encode_table(obj, self.shape)
+        return session.encode_any(obj)
+
+
+class LogsNode:
+    __slots__ = ("shape",)
+
+    def __init__(self, shape: TableShape):
+        self.shape = shape
+
+    def encode(self, session, obj):
+        if (
+            isinstance(obj, list)
+            and len(obj) >= 2
+            and all(isinstance(x, str) for x in obj)
+        ):
+            return session.encode_logs(obj, self.shape)
+        return session.encode_any(obj)
+
+
+class DictNode:
+    __slots__ = ("children",)
+
+    def __init__(self, children: dict):
+        self.children = children
+
+    def encode(self, session, obj):
+        if not isinstance(obj, dict):
+            return session.encode_any(obj)
+        children = self.children
+        return {
+            k: children[k].encode(session, v) if k in children else session.encode_any(v)
+            for k, v in obj.items()
+        }
+
+
+class ListNode:
+    __slots__ = ("children",)
+
+    def __init__(self, children: list):
+        self.children = children
+
+    def encode(self, session, obj):
+        if not isinstance(obj, list) or len(obj) != len(self.children):
+            return session.encode_any(obj)
+        return [node.encode(session, x) for node, x in zip(self.children, obj)]
+
+
+class LeafNode:
+    __slots__ = ()
+
+    def encode(self, session, obj):
+        if isinstance(obj, (dict, list)):
+            return session.encode_any(obj)
+        return obj
+
+
+LEAF = LeafNode()
+
+
+def compile_node(obj, shapes, path, tables):
+    """Plan node for `obj`, mirroring Encoder.encode_any's detection order."""
+    if isinstance(obj, list) and is_table(obj):
+        tables[path] = shape = next(shapes)
+        return TableNode(shape)
+
+    if isinstance(obj, list) and (is_categorical_strings(obj) or is_log_lines(obj)):
+        tables[path] = shape = next(shapes)
+        return LogsNode(shape)
+
+    if isinstance(obj, dict):
+        return DictNode({
+            k: compile_node(v, shapes, path + (k,), tables) for k, v in obj.items()
+        })
+
+    if isinstance(obj, list):
+        return ListNode([
+            compile_node(x, shapes, path + (i,), tables) for i, x in enumerate(obj)
+        ])
+
+    return LEAF
+
+# ---------------- PLAN ----------------
+
+class EncoderPlan:
+    """
+    Reusable encoding plan for payloads shaped like its sample.
+    `tables` maps each table path to its TableShape and `types` is the
+    sample's type registry. Plans are read-only once compiled, so one
+    plan can serve many threads.
+    """
+
+    def __init__(self, root, tables, types, model=None, dictionary=None):
+        self.root = root
+        self.tables = tables
+        self.types = types
+        self.model = model
+        self.dictionary = dictionary
+
+    def describe(self):
+        """{path label: {key: column type}} of every planned table."""
+        return {
+            path_label(path) or "$": shape.types
+            for path, shape in self.tables.items()
+        }
+
+    def encode(self, payload, *, store=None, return_structure=False, shared=False):
+        """
+        Encode `payload` along the plan. Types go to `store` if given;
+        `return_structure=True` returns (encoded, types).
+        """
+        session = Encoder(self.model, dictionary=self.dictionary, plan=self)
+        encoded = session.encode(payload, shared=shared)
+
+        if store is not None:
+            store.save(session.types)
+        if return_structure:
+            return encoded, session.types
+        return encoded
+
+
+def compile_plan(sample, model: str | None = None, dictionary=None) -> EncoderPlan:
+    """Encode `sample` once and keep the decisions as an EncoderPlan."""
+    session = Encoder(model)
+    session.shapes = []
+    session.encode_any(sample)
+
+    tables = {}
+    root = compile_node(sample, iter(session.shapes), (), tables)
+    return EncoderPlan(root, tables, session.types, model, dictionary)
@@ -0,0 +1,156 @@
+# prompt.py — Plain-text COIL documents for prompts
+# One labeled section per table instead of a JSON wrapper, so meta and
+# body reach the model without quotes or doubled backslashes:
+#   ## transactions
+#   META&ORDER=amount,city&tid=tbl_1&vmap=V1:Chennai
+#   BODY|table[2]{amount,city}|499,V1|1299,V1
+#   ## $
+#   {"transactions": null, "page": 2}
+# `$` is the payload itself: the table, or the JSON skeleton with null
+# where each labeled table goes.
+
+import json
+import re
+
+from . import tokenizer
+
+SECTION = "## "
+ROOT = "$"
+
+_NAME = re.compile(r"[A-Za-z_][\w-]*")
+_STEP = re.compile(r"\.([A-Za-z_][\w-]*)|\[(\d+)\]")
+
+
+def _is_table(obj):
+    return isinstance(obj, dict) and "meta" in obj and "body" in obj
+
+
+def _check_output(output):
+    if output not in ("json", "text"):
+        raise ValueError(f"output must be 'json' or 'text', not {output!r}")
+
+# ---------------- PATH LABELS ----------------
+
+def path_label(path):
+    """("data", "items", 0) -> data.items[0]; JSON array if keys need quoting."""
+    out = []
+    for step in path:
+        if isinstance(step, int):
+            out.append(f"[{step}]")
+        elif _NAME.fullmatch(step):
+            out.append(f".{step}" if out else step)
+        else:
+            return json.dumps(list(path), ensure_ascii=False)
+    return "".join(out)
+
+
+def parse_label(label):
+    if label.startswith("["):
+        try:
+            return json.loads(label)
+        except ValueError:
+            pass  # [0].name is a dotted label
+    path = []
+    m = _NAME.match(label)
+    pos = 0
+    if m:
+        path.append(m.group())
+        pos = m.end()
+    while pos < len(label):
+        m = _STEP.match(label, pos)
+        if not m:
+            raise ValueError(f"Bad section label: {label!r}")
+        path.append(m.group(1) if m.group(1) is not None else int(m.group(2)))
+        pos = m.end()
+    return path
+
+# ---------------- RENDER ----------------
+
+def _line(s):
+    """Meta / body text as one line (JSON-quoted if it spans lines)."""
+    return json.dumps(s, ensure_ascii=False) if "\n" in s or "\r" in s else s
+
+
+def _skeleton(obj, path, tables):
+    if _is_table(obj):
+        tables.append((path, obj))
+        return None
+    if isinstance(obj, dict):
+        return {k: _skeleton(v, path + (k,), tables) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_skeleton(v, path + (i,), tables) for i, v in enumerate(obj)]
+    return obj
+
+
+def render_prompt(encoded) -> str:
+    """Encoded payload -> plain-text COIL document."""
+    if _is_table(encoded):
+        return "\n".join([SECTION + ROOT, _line(encoded["meta"]), _line(encoded["body"])])
+
+    tables = []
+    skeleton = _skeleton(encoded, (), tables)
+
+    lines = []
+    for path, t in tables:
+        lines += [SECTION + path_label(path), _line(t["meta"]), _line(t["body"])]
+    lines += [SECTION + ROOT, json.dumps(skeleton, ensure_ascii=False)]
+    return "\n".join(lines)
+
+# ---------------- PARSE ----------------
+
+def _unline(s):
+    return json.loads(s) if s.startswith('"') else s
+
+
+def parse_prompt(text: str):
+    """Plain-text COIL document -> encoded payload (as encode() returns it)."""
+    sections = []
+    for line in text.split("\n"):
+        line = line.rstrip("\r")
+        if line.startswith(SECTION):
+            sections.append((line[len(SECTION):], []))
+        elif sections:
+            sections[-1][1].append(line)
+        elif line.strip():
+            raise ValueError("Text before the first COIL section")
+
+    tables = []
+    root = None
+    for label, lines in sections:
+        if label == ROOT:
+            first = _unline(lines[0]) if lines else ""
+            if len(lines) >= 2 and isinstance(first, str) and first.startswith("META&"):
+                return {"meta": first, "body": _unline(lines[1])}
+            root = json.loads("\n".join(lines))
+        else:
+            if len(lines) < 2:
+                raise ValueError(f"Section {label!r} needs a META and a BODY line")
+            tables.append((parse_label(label), lines))
+
+    for path, lines in tables:
+        table = {"meta": _unline(lines[0]), "body": _unline(lines[1])}
+        if not path:
+            return table
+        node = root
+        for step in path[:-1]:
+            node = node[step]
+        node[path[-1]] = table
+
+    return root
+
+# ---------------- TOKEN REPORT ----------------
+
+def prompt_tokens(encoded, model: str | None = None, output: str = "json") -> dict:
+    """
+    Token counts of the same encoded payload in both emission modes.
+    `output` says which one `encoded` is in (as passed to encode).
+    """
+    _check_output(output)
+    if output == "text":
+        text, payload = encoded, parse_prompt(encoded)
+    else:
+        text, payload = render_prompt(encoded), encoded
+    return {
+        "json": tokenizer.count(json.dumps(payload, ensure_ascii=False), model),
+        "text": tokenizer.count(text, model),
+    }
@@ -1,9 +1,9 @@
 import json
 import os
+import tracemalloc
 from .compare import isLossless 
-
-def _token_count(text: str) -> int:
-    return max(1, len(text) // 4)
+from .tokenizer import count as _token_count
+from .prompt import prompt_tokens
 
 
 def _word_count(text: str) -> int:
@@ -14,9 +14,9 @@ def _bytes(text: str) -> int:
     return len(text.encode("utf-8"))
 
 
-def analyze(original, encoded, decoded=None):
+def analyze(original, encoded, decoded=None, output="json"):
     o = json.dumps(original, ensure_ascii=False)
-    e = json.dumps(encoded, ensure_ascii=False)
+    e = encoded if output == "text" else json.dumps(encoded, ensure_ascii=False)
 
     stats = {
         "original": {
@@ -44,6 +44,9 @@ def analyze(original, encoded, decoded=None):
         "twr_encoded": round(stats["encoded"]["tokens"] / max(1, stats["encoded"]["words"]), 3),
     }
 
+    # same encoding as JSON objects vs a plain-text prompt document
+    stats["modes"] = prompt_tokens(encoded, output=output)
+
     if decoded is not None:
         stats["lossless"] = isLossless(original,decoded)
 
@@ -54,3 +57,41 @@ def save_stats(stats, out_file="coil_stats.json"):
     with open(out_file, "w", encoding="utf-8") as f:
         json.dump(stats, f, indent=2, ensure_ascii=False)
     return out_file
+
+
+def roundtrip_memory(payload):
+    """
+    Peak traced memory (bytes) of encode and decode on `payload`.
+    Both build output with structural sharing, so peaks stay a small
+    multiple of the encoded size rather than copies of the input.
+    The type registry goes to an in-memory store (no file I/O traced).
+    """
+    from .enc import encode
+    from .dec import decode
+    from .store import MemoryStore
+
+    store = MemoryStore()
+
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+
+    try:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        encoded = encode(payload, store=store)
+        encode_peak = tracemalloc.get_traced_memory()[1] - base
+
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        decode(encoded, store=store)
+        decode_peak = tracemalloc.get_traced_memory()[1] - base
+    finally:
+        if started:
+            tracemalloc.stop()
+
+    return {
+        "payload_bytes": _bytes(json.dumps(payload, ensure_ascii=False)),
+        "encode_peak_bytes": encode_peak,
+        "decode_peak_bytes": decode_peak,
+    }
@@ -0,0 +1,155 @@
+# store.py — COIL structure stores
+# Where the type registry (structure) lives between encode and decode
+# Memory / JSON file / SQLite backends behind one interface
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class StructureStore:
+    """Save / load one type registry (dict: table id -> column types)."""
+
+    def save(self, types: dict):
+        raise NotImplementedError
+
+    def load(self) -> dict:
+        raise NotImplementedError
+
+
+class MemoryStore(StructureStore):
+    """Process-local store; no I/O."""
+
+    def __init__(self, types: dict | None = None):
+        self._types = types
+
+    def save(self, types):
+        self._types = types
+
+    def load(self):
+        if self._types is None:
+            raise LookupError("No structure saved in memory store")
+        return self._types
+
+
+class FileStore(StructureStore):
+    """
+    JSON file (the classic coil_types.json). Loads are cached and only
+    re-read when the file's mtime/size change.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._types = None
+
+    def _stat(self):
+        st = os.stat(self.path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def save(self, types):
+        tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(types, f, indent=2)
+        os.replace(tmp, self.path)  # readers never see a partial file
+
+        with self._lock:
+            self._stamp = self._stat()
+            self._types = types
+
+    def load(self):
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"Structure file not found: {self.path}")
+
+        stamp = self._stat()
+        with self._lock:
+            if stamp == self._stamp:
+                return self._types
+
+        with open(self.path, "r", encoding="utf-8") as f:
+            types = json.load(f)
+
+        with self._lock:
+            self._stamp = stamp
+            self._types = types
+        return types
+
+
+class SQLiteStore(StructureStore):
+    """
+    Named structures in a SQLite table. Loads are cached per name and
+    re-read only when the row's `updated` stamp changes.
+    """
+
+    def __init__(self, path: str, name: str = "default"):
+        self.path = path
+        self.name = name
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._types = None
+
+        self._execute(
+            "CREATE TABLE IF NOT EXISTS coil_structures ("
+            "name TEXT PRIMARY KEY, types TEXT NOT NULL, updated INTEGER NOT NULL)"
+        )
+
+    def _execute(self, sql, args=()):
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            with db:
+                return db.execute(sql, args).fetchone()
+        finally:
+            db.close()
+
+    def save(self, types):
+        stamp = time.time_ns()
+        self._execute(
+            "INSERT OR REPLACE INTO coil_structures (name, types, updated) "
+            "VALUES (?, ?, ?)",
+            (self.name, json.dumps(types), stamp),
+        )
+
+        with self._lock:
+            self._stamp = stamp
+            self._types = types
+
+    def load(self):
+        row = self._execute(
+            "SELECT updated FROM coil_structures WHERE name = ?", (self.name,)
+        )
+        if row is None:
+            raise LookupError(f"No structure named {self.name!r} in {self.path}")
+
+        with self._lock:
+            if row[0] == self._stamp:
+                return self._types
+
+        stamp, types = self._execute(
+            "SELECT updated, types FROM coil_structures WHERE name = ?",
+            (self.name,),
+        )
+
+        types = json.loads(types)
+        with self._lock:
+            self._stamp = stamp
+            self._types = types
+        return types
+
+
+# ---------------- FILE STORE CACHE ----------------
+
+_file_stores = {}
+_file_lock = threading.Lock()
+
+
+def file_store(path: str) -> FileStore:
+    """Shared FileStore per path, so its load cache survives across calls."""
+    path = os.path.abspath(path)
+    with _file_lock:
+        store = _file_stores.get(path)
+        if store is None:
+            store = _file_stores[path] = FileStore(path)
+        return store
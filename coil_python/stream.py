@@ -0,0 +1,153 @@
+# stream.py — Streaming COIL encoder / decoder
+# Incremental parse of a top-level JSON array, encoded in row chunks
+# Decoded back record-by-record to NDJSON
+# Peak memory scales with chunk size, not with file size
+
+import json
+
+from .enc import Encoder, TYPE_FILE
+from .dec import Decoder, STREAM_KEY
+from .store import file_store
+
+CHUNK_ROWS = 10000
+READ_SIZE = 1 << 16
+
+_WS = " \t\r\n"
+_DELIM = _WS + ",]"
+
+# ---------------- INCREMENTAL JSON ARRAY READER ----------------
+
+def iter_json_array(fp, read_size: int = READ_SIZE):
+    """
+    Yield the items of the top-level JSON array in `fp` one at a time.
+    Raises ValueError if the document is not an array.
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buf, pos, eof
+        data = fp.read(read_size)
+        if not data:
+            eof = True
+        buf = buf[pos:] + data
+        pos = 0
+
+    def skip_ws():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in _WS:
+                pos += 1
+            if pos < len(buf) or eof:
+                return
+            fill()
+
+    skip_ws()
+    if pos >= len(buf) or buf[pos] != "[":
+        raise ValueError("Streaming input must be a top-level JSON array")
+    pos += 1
+
+    skip_ws()
+    if pos < len(buf) and buf[pos] == "]":
+        return
+
+    while True:
+        skip_ws()
+        try:
+            item, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            item, end = None, None
+
+        # a value not followed by a delimiter may be cut short ("12|3", "-7|e5")
+        if end is None or end >= len(buf) or buf[end] not in _DELIM:
+            if not eof:
+                fill()
+                continue
+            if end is None:
+                raise ValueError(f"Malformed JSON array near offset {pos}")
+
+        pos = end
+        yield item
+
+        skip_ws()
+        if pos >= len(buf):
+            raise ValueError("Unterminated JSON array")
+        if buf[pos] == "]":
+            return
+        if buf[pos] != ",":
+            raise ValueError(f"Expected ',' or ']' near offset {pos}")
+        pos += 1
+
+# ---------------- CHUNKED ENCODER ----------------
+
+def iter_chunks(items, chunk_rows: int = CHUNK_ROWS):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_rows:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def encode_stream(fin, fout, *, chunk_rows: int = CHUNK_ROWS, store=None, session=None):
+    """
+    Encode the JSON array in `fin` to `fout` as a JSON array of encoded
+    chunks, writing each chunk as soon as it is encoded. The structure
+    records the chunking so decode() returns the flat array again.
+    Returns the structure (type registry).
+    """
+    session = session or Encoder()
+    session.reset()
+
+    rows = 0
+    chunks = 0
+    fout.write("[")
+    for chunk in iter_chunks(iter_json_array(fin), chunk_rows):
+        fout.write(",\n" if chunks else "\n")
+        json.dump(session.encode_any(chunk), fout, ensure_ascii=False)
+        rows += len(chunk)
+        chunks += 1
+    fout.write("\n]\n")
+
+    session.types[STREAM_KEY] = {"chunks": chunks, "rows": rows}
+    (store or file_store(TYPE_FILE)).save(session.types)
+
+    return session.types
+
+# ---------------- STREAMING DECODER ----------------
+
+def _peek(fp):
+    """First non-whitespace char of a seekable text file (position kept)."""
+    start = fp.tell()
+    ch = " "
+    while ch and ch in _WS:
+        ch = fp.read(1)
+    fp.seek(start)
+    return ch
+
+
+def iter_decode_file(fin, types: dict):
+    """Yield decoded records from an encoded file one at a time."""
+    decoder = Decoder(types)
+
+    if _peek(fin) == "[":
+        for item in iter_json_array(fin):
+            yield from decoder.iter_item(item)
+    else:
+        yield from decoder.iter_decode(json.load(fin))
+
+
+def decode_stream(fin, fout, *, store=None):
+    """Decode `fin` to NDJSON on `fout`, one record per line. Returns the count."""
+    types = (store or file_store(TYPE_FILE)).load()
+
+    n = 0
+    for rec in iter_decode_file(fin, types):
+        fout.write(json.dumps(rec, ensure_ascii=False))
+        fout.write("\n")
+        n += 1
+    return n
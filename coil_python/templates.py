@@ -0,0 +1,147 @@
+# templates.py — Log template mining for COIL log tables
+# Drain-style clustering: lines with the same token count and similar
+# constant tokens share a template; differing tokens become * slots,
+# trimmed to the part that actually varies
+#   TPL=INFO: user * logged in from *;WARN: disk * full
+#   BODY|table[n]{msg}|0,alice,10.0.0.1|1,92%|...
+
+import re
+from os.path import commonprefix
+
+SLOT = "*"
+SIM_THRESHOLD = 0.5
+
+_TOKEN = re.compile(r"\s+|\w+|[^\w\s]")
+_DIGIT = re.compile(r"\d")
+_FORCED = set("*&;\\")     # never constant: slot marker / meta separators
+
+# ---------------- ENCODER SIDE ----------------
+
+def _mask(tok):
+    """None for tokens that are parameters up front (numbers, ids)."""
+    if _DIGIT.search(tok) or any(ch in _FORCED for ch in tok):
+        return None
+    return tok
+
+
+def _similarity(template, tokens):
+    same = sum(1 for t, m in zip(template, tokens) if t is None or t == m)
+    return same / len(tokens) if tokens else 1.0
+
+
+def _safe_prefix(s):
+    for i, ch in enumerate(s):
+        if ch in _FORCED:
+            return s[:i]
+    return s
+
+
+def _common_affixes(params):
+    """Longest common prefix / suffix of a slot's values (non-overlapping)."""
+    shortest = min(len(p) for p in params)
+    pre = _safe_prefix(commonprefix(params))[:shortest]
+    rest = [p[len(pre):] for p in params]
+    suf = _safe_prefix(commonprefix([r[::-1] for r in rest]))
+    suf = suf[:shortest - len(pre)][::-1]
+    return pre, suf
+
+
+def mine_templates(lines, threshold: float = SIM_THRESHOLD):
+    """
+    Cluster `lines` into templates. Returns (templates, rows): template
+    texts with * for each slot, and per line (template index, params).
+    Joining a template's pieces with the params rebuilds the line exactly.
+    """
+    groups = {}     # (token count, first token) -> [cluster index]
+    clusters = []   # template tokens (None = wildcard)
+    members = []    # line indices per cluster
+    tokenized = []
+
+    for n, line in enumerate(lines):
+        toks = _TOKEN.findall(line)
+        masked = [_mask(t) for t in toks]
+        key = (len(toks), masked[0] if masked else "")
+
+        best, best_sim = None, threshold
+        for ci in groups.get(key, ()):
+            sim = _similarity(clusters[ci], masked)
+            if sim >= best_sim:
+                best, best_sim = ci, sim
+
+        if best is None:
+            best = len(clusters)
+            clusters.append(masked)
+            members.append([])
+            groups.setdefault(key, []).append(best)
+        else:
+            clusters[best] = [
+                t if t == m else None for t, m in zip(clusters[best], masked)
+            ]
+
+        tokenized.append(toks)
+        members[best].append(n)
+
+    templates = []
+    rows = [None] * len(lines)
+    for ci, (tpl, idx) in enumerate(zip(clusters, members)):
+        # wildcards that never vary (masked numbers) are constants after all
+        for pos, t in enumerate(tpl):
+            if t is None:
+                seen = {tokenized[i][pos] for i in idx}
+                if len(seen) == 1 and _safe_prefix(next(iter(seen))) == next(iter(seen)):
+                    tpl[pos] = seen.pop()
+
+        # consecutive wildcards share one slot
+        parts = []
+        params = [[] for _ in idx]
+        for pos, t in enumerate(tpl):
+            if t is not None:
+                parts.append(t)
+                continue
+            if not parts or parts[-1] is not None:
+                parts.append(None)
+                for p in params:
+                    p.append("")
+            for p, i in zip(params, idx):
+                p[-1] += tokenized[i][pos]
+
+        # hoist a slot's common prefix / suffix into the template
+        out = []
+        slot = 0
+        for t in parts:
+            if t is not None:
+                out.append(t)
+                continue
+            pre, suf = _common_affixes([p[slot] for p in params])
+            for p in params:
+                p[slot] = p[slot][len(pre):len(p[slot]) - len(suf)]
+            out.extend([pre, SLOT, suf])
+            slot += 1
+
+        templates.append("".join(out))
+        for i, p in zip(idx, params):
+            rows[i] = (ci, p)
+
+    return templates, rows
+
+
+def template_meta(templates):
+    return ";".join(templates)
+
+# ---------------- DECODER SIDE ----------------
+
+def parse_templates(text):
+    """`tpl;tpl;...` -> [literal pieces per template]"""
+    return [t.split(SLOT) for t in text.split(";")]
+
+
+def fill_slots(pieces, params):
+    if len(params) != len(pieces) - 1:
+        raise ValueError(
+            f"Template expects {len(pieces) - 1} params, got {len(params)}"
+        )
+    out = [pieces[0]]
+    for p, lit in zip(params, pieces[1:]):
+        out.append(p)
+        out.append(lit)
+    return "".join(out)
@@ -0,0 +1,262 @@
+# tokenizer.py — Shared token counting
+# Pluggable backends keyed by TOKENIZER_MAP, one memoized counter
+# Repeated cells / headers / meta fragments are tokenized once per process
+
+import math
+import threading
+from collections import OrderedDict
+
+CACHE_SIZE = 65536          # max memoized strings
+CACHE_CHARS = 1 << 24       # max memoized characters in total (~16M)
+MAX_CACHED_LEN = 1 << 12    # longer strings are counted but not memoized
+
+# -------------------------
+# TOKENIZER MAP (model -> backend)
+# -------------------------
+
+TOKENIZER_MAP = {
+    "gpt-4o": "tiktoken:gpt-4o",
+    "gpt-4o-mini": "tiktoken:gpt-4o-mini",
+    "gpt-4.1": "tiktoken:gpt-4.1",
+    "claude-3": "anthropic",
+    "gemini": "google",
+    "mistral": "mistral",
+    "default": "generic"
+}
+
+# Offline estimators: average chars per token on JSON / COIL text
+CHARS_PER_TOKEN = {
+    "anthropic": 3.5,
+    "google": 4.0,
+    "mistral": 3.6,
+    "generic": 4.0,
+}
+
+# ---------------- LRU MEMO ----------------
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+_hits = 0
+_misses = 0
+_chars = 0   # total length of memoized strings
+
+
+def _lookup(key):
+    global _hits
+    with _lock:
+        n = _cache.get(key)
+        if n is not None:
+            _cache.move_to_end(key)
+            _hits += 1
+        return n
+
+
+def _store(key, n):
+    global _misses, _chars
+    with _lock:
+        _misses += 1
+        if len(key[1]) > MAX_CACHED_LEN:
+            return
+        if key not in _cache:
+            _chars += len(key[1])
+        _cache[key] = n
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE or _chars > CACHE_CHARS:
+            (_, old), _ = _cache.popitem(last=False)
+            _chars -= len(old)
+
+# ---------------- BACKENDS ----------------
+
+class Backend:
+    """
+    Token counter for one model family.
+
+    `measure` is an additive cost of a fragment and `finish` turns a
+    summed cost back into tokens, so optimizers can price fragments
+    independently and still land on the backend's own total.
+    """
+
+    name = "generic"
+
+    def _raw_count(self, s):
+        raise NotImplementedError
+
+    def _raw_count_many(self, strings):
+        return [self._raw_count(s) for s in strings]
+
+    def count(self, s: str) -> int:
+        key = (self.name, s)
+        n = _lookup(key)
+        if n is None:
+            n = self._raw_count(s)
+            _store(key, n)
+        return n
+
+    def count_many(self, strings) -> list:
+        strings = list(strings)
+        out = [_lookup((self.name, s)) for s in strings]
+
+        todo = list(dict.fromkeys(s for s, n in zip(strings, out) if n is None))
+        if todo:
+            fresh = dict(zip(todo, self._raw_count_many(todo)))
+            for s in todo:
+                _store((self.name, s), fresh[s])
+            out = [fresh[s] if n is None else n for s, n in zip(strings, out)]
+
+        return out
+
+    def measure(self, s: str):
+        return self.count(s)
+
+    def measure_many(self, strings) -> list:
+        return self.count_many(strings)
+
+    def finish(self, n):
+        return n
+
+
+class EstimatorBackend(Backend):
+    """Offline estimate: ceil(chars / chars_per_token)."""
+
+    def __init__(self, name: str, chars_per_token: float):
+        self.name = name
+        self.chars_per_token = chars_per_token
+
+    def _raw_count(self, s):
+        return max(1, math.ceil(len(s) / self.chars_per_token))
+
+    # chars add up exactly across joined fragments
+    def measure(self, s):
+        return len(s)
+
+    def measure_many(self, strings):
+        return [len(s) for s in strings]
+
+    def finish(self, n):
+        return max(1, math.ceil(n / self.chars_per_token))
+
+
+class TiktokenBackend(Backend):
+    """tiktoken encoder, loaded on first use."""
+
+    def __init__(self, model: str):
+        self.name = f"tiktoken:{model}"
+        self.model = model
+        self._enc = None
+        self._load_lock = threading.Lock()
+
+    def encoder(self):
+        if self._enc is None:
+            with self._load_lock:
+                if self._enc is None:
+                    import tiktoken
+                    self._enc = tiktoken.encoding_for_model(self.model)
+        return self._enc
+
+    def _raw_count(self, s):
+        return len(self.encoder().encode(s))
+
+    def _raw_count_many(self, strings):
+        return [len(t) for t in self.encoder().encode_batch(strings)]
+
+
+def _has_tiktoken():
+    try:
+        import tiktoken  # noqa: F401
+        return True
+    except Exception:
+        return False
+
+
+def _make_backend(spec: str) -> Backend:
+    if spec.startswith("tiktoken:"):
+        if _has_tiktoken():
+            return TiktokenBackend(spec.split(":", 1)[1])
+        return EstimatorBackend(spec, CHARS_PER_TOKEN["generic"])
+
+    if spec == "generic" and _has_tiktoken():
+        # historic default: gpt-4o-mini whenever tiktoken is installed
+        return TiktokenBackend("gpt-4o-mini")
+
+    if spec in CHARS_PER_TOKEN:
+        return EstimatorBackend(spec, CHARS_PER_TOKEN[spec])
+
+    raise KeyError(f"Unknown tokenizer backend: {spec}")
+
+# ---------------- REGISTRY ----------------
+
+_backends = {}
+_active = "generic"
+
+
+def resolve(model: str | None = None) -> str:
+    """Map a model name (or backend spec) to its backend spec."""
+    if model is None:
+        return _active
+    return TOKENIZER_MAP.get(model, model)
+
+
+def backend(model: str | None = None) -> Backend:
+    """Backend for `model` (active one if None), created once per process."""
+    spec = resolve(model)
+    b = _backends.get(spec)
+    if b is None:
+        with _lock:
+            b = _backends.get(spec)
+            if b is None:
+                b = _backends[spec] = _make_backend(spec)
+    return b
+
+
+def set_model(model: str) -> str:
+    """Make `model`'s backend the active one; returns its spec."""
+    global _active
+    spec = resolve(model)
+    backend(spec)
+    _active = spec
+    return spec
+
+# ---------------- PUBLIC API ----------------
+
+def count(s: str, model: str | None = None) -> int:
+    """Token count of `s`, memoized per (backend, string)."""
+    return backend(model).count(s)
+
+
+def count_many(strings, model: str | None = None) -> list:
+    """Token counts for many strings; cache misses are tokenized in one batch."""
+    return backend(model).count_many(strings)
+
+
+def measure(s: str, model: str | None = None):
+    return backend(model).measure(s)
+
+
+def measure_many(strings, model: str | None = None) -> list:
+    return backend(model).measure_many(strings)
+
+
+def finish(n, model: str | None = None):
+    return backend(model).finish(n)
+
+
+def cache_info() -> dict:
+    with _lock:
+        return {
+            "backend": _active,
+            "hits": _hits,
+            "misses": _misses,
+            "size": len(_cache),
+            "maxsize": CACHE_SIZE,
+            "chars": _chars,
+            "maxchars": CACHE_CHARS,
+        }
+
+
+def cache_clear():
+    global _hits, _misses, _chars
+    with _lock:
+        _cache.clear()
+        _hits = 0
+        _misses = 0
+        _chars = 0
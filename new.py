@@ -11,14 +11,10 @@ from dec import decode
 
 # ---------------- TOKEN COUNT ----------------
 
-try:
-    import tiktoken
-    ENC = tiktoken.encoding_for_model("gpt-4o-mini")
-    def token_count(s): return len(ENC.encode(s))
-    TOKENIZER = "gpt-4o-mini"
-except Exception:
-    def token_count(s): return max(1, (len(s) + 3) // 4)
-    TOKENIZER = "approx"
+from coil_python.tokenizer import count as token_count
+from coil_python.tokenizer import backend as _backend
+
+TOKENIZER = _backend().name
 
 # ---------------- METRICS ----------------
 
@@ -0,0 +1,80 @@
+# test_concurrency.py — Encoder / Decoder sessions under a thread pool
+
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import coil_python
+from coil_python import Decoder, Encoder
+from coil_python.enc import encode_any
+
+N_PAYLOADS = 2000
+CITIES = ["Bangalore", "Chennai", "Hyderabad", "Mumbai", "Pune"]
+STATUSES = ["COMPLETED", "PENDING", "FAILED"]
+
+
+def make_payload(seed):
+    rnd = random.Random(seed)
+    n = rnd.randint(2, 30)
+    return {
+        "id": seed,
+        "transactions": [
+            {
+                "txn": f"TXN{1000 + seed + i}",
+                "city": rnd.choice(CITIES),
+                "status": rnd.choice(STATUSES),
+                "amount": rnd.randint(1, 9999),
+                "note": rnd.choice(["ok", "a,b", "x|y", "path\\to", "k:v"]),
+            }
+            for i in range(n)
+        ],
+        "events": [rnd.choice(["login", "logout", "view"]) for _ in range(n + 2)],
+    }
+
+
+def roundtrip(payload):
+    session = Encoder()
+    encoded = session.encode(payload)
+    return encoded, session.types, Decoder(session.types).decode(encoded)
+
+
+def test_threaded_roundtrip_matches_single_threaded():
+    payloads = [make_payload(seed) for seed in range(N_PAYLOADS)]
+    expected = [roundtrip(p)[:2] for p in payloads]
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(roundtrip, payloads))
+
+    for payload, (encoded, types), (got, got_types, decoded) in zip(
+        payloads, expected, results
+    ):
+        assert decoded == payload
+        assert got == encoded
+        assert got_types == types
+
+
+def test_module_api_keeps_no_state_between_calls():
+    payload = make_payload(1)["transactions"]
+    first = encode_any(payload)
+    for _ in range(50):
+        assert encode_any(payload) == first
+    assert first["meta"].split("&tid=")[1].split("&")[0] == "tbl_1"
+
+
+def test_sessions_follow_set_model():
+    session = Encoder()
+    try:
+        coil_python.set_model("claude-3")
+        assert session.backend.name == "anthropic"
+    finally:
+        coil_python.set_model("default")
+
+
+def test_public_encode_in_threads():
+    payloads = [make_payload(seed) for seed in range(200)]
+
+    def run(p):
+        encoded, types = coil_python.encode(p, return_structure=True)
+        return coil_python.decode(encoded, structure=types)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        assert list(pool.map(run, payloads)) == payloads
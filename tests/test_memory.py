@@ -0,0 +1,39 @@
+# test_memory.py — Round-trip peak memory stays proportional to the payload
+
+import random
+
+from coil_python.stats import roundtrip_memory
+
+MAX_RATIO = 24   # traced peak bytes per payload byte (Python objects included)
+
+
+def make_payload(n, seed=5):
+    rnd = random.Random(seed)
+    return [
+        {
+            "id": i,
+            "user": f"user_{rnd.randint(0, 50)}",
+            "city": rnd.choice(["Bangalore", "Chennai", "Mumbai", "Pune"]),
+            "amt": round(rnd.random() * 1000, 2),
+            "note": "x" * rnd.randint(0, 20),
+        }
+        for i in range(n)
+    ]
+
+
+def test_roundtrip_peak_is_bounded():
+    ratios = []
+    for n in (500, 4000, 16000):
+        m = roundtrip_memory(make_payload(n))
+        peak = max(m["encode_peak_bytes"], m["decode_peak_bytes"])
+        ratios.append(peak / m["payload_bytes"])
+        assert peak < MAX_RATIO * m["payload_bytes"], (n, m)
+
+    # no copy of the input per row: the ratio must not grow with size
+    assert ratios[-1] <= ratios[0] * 1.25, ratios
+
+
+def test_roundtrip_writes_no_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    roundtrip_memory(make_payload(100))
+    assert list(tmp_path.iterdir()) == []
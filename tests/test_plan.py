@@ -0,0 +1,58 @@
+# test_plan.py — Compiled plans decide data-dependent choices per payload
+
+import random
+
+import coil_python
+from coil_python import compile_plan
+
+CITIES = ["Bangalore", "Chennai", "Hyderabad", "Mumbai", "Pune"]
+
+
+def make_payload(n, seed=0):
+    rnd = random.Random(seed)
+    return {
+        "page": seed,
+        "transactions": [
+            {
+                "id": f"TXN{1000 + i}",
+                "city": rnd.choice(CITIES),
+                "amount": rnd.randint(1, 999),
+                "note": rnd.choice(["ok", "a,b", "retry later"]),
+            }
+            for i in range(n)
+        ],
+        "logs": [f"INFO: user u{rnd.randint(0, 9)} logged in" for _ in range(n)],
+    }
+
+
+def test_small_sample_plan_matches_generic_on_large_payload():
+    plan = compile_plan(make_payload(2))
+    for seed in range(5):
+        payload = make_payload(500, seed)
+        assert plan.encode(payload, return_structure=True) == coil_python.encode(
+            payload, return_structure=True
+        )
+
+
+def test_plan_roundtrip_and_drift():
+    plan = compile_plan(make_payload(20))
+    payload = make_payload(50, seed=3)
+    payload["transactions"][0]["extra"] = "x"
+    payload["logs"] = "not a list any more"
+    payload["new"] = [{"k": 1}, {"k": 2}]
+
+    encoded, types = plan.encode(payload, return_structure=True)
+    assert encoded == coil_python.encode(payload, return_structure=True)[0]
+    assert coil_python.decode(encoded, structure=types)["new"] == payload["new"]
+
+
+def test_plan_codecs_follow_payload_not_sample():
+    sample = make_payload(2)
+    for i, row in enumerate(sample["transactions"]):
+        row["id"] = "AB"[i]   # no sequence in the sample's ids
+    plan = compile_plan(sample)
+    payload = make_payload(200, seed=1)
+
+    encoded = plan.encode(payload)
+    assert encoded == coil_python.encode(payload)
+    assert "seq(" in encoded["transactions"]["meta"]
@@ -0,0 +1,240 @@
+# test_roundtrip.py — Lossless round trips through every wire format
+
+import random
+
+import pytest
+
+import coil_python
+
+
+def roundtrip(payload, **kwargs):
+    encoded, types = coil_python.encode(payload, return_structure=True, **kwargs)
+    output = kwargs.get("output", "json")
+    assert coil_python.decode(encoded, structure=types, output=output) == payload
+    return encoded
+
+
+def test_cmap_key_with_colon():
+    payload = [{"ns:city": ["Bangalore", "Chennai"][i % 2], "n": i * i} for i in range(30)]
+    encoded = roundtrip(payload)
+    assert "CMAP=ns:city" not in encoded["meta"]
+
+
+def test_delims_ignore_columns_moved_to_codecs():
+    payload = [{"k": f"a|b|c|d|e|f{i}", "n": i} for i in range(30)]
+    encoded = roundtrip(payload)
+    assert "DELIM=" not in encoded["meta"]
+
+
+def test_column_layout_streams_lazily():
+    from coil_python.dec import iter_decode_table
+    from coil_python.enc import Encoder
+
+    records = [
+        {"t": 20 + (i // 50) % 7, "h": "a,b|c" if i % 1000 == 0 else f"ok{(i // 300) % 3}"}
+        for i in range(20000)
+    ]
+    session = Encoder()
+    table = session.encode_table(records)
+    assert "LAYOUT=col" in table["meta"]
+
+    rows = iter_decode_table(table["meta"], table["body"], session.types)
+    assert next(rows) == records[0]
+    assert [records[0]] + list(rows) == records
+
+
+# ---------------- COLUMN CODECS ----------------
+
+def rows(count, seed=0, /, **columns):
+    """`count` records whose columns come from `columns` ({key: f(i, rnd)})."""
+    rnd = random.Random(seed)
+    return [{k: f(i, rnd) for k, f in columns.items()} for i in range(count)]
+
+
+CODEC_CASES = {
+    "step(": rows(40, n=lambda i, r: 100 + 7 * i, v=lambda i, r: r.choice("abc")),
+    "delta(": rows(40, n=lambda i, r: 1000 + i * i, v=lambda i, r: r.choice("abc")),
+    "for(": rows(40, n=lambda i, r: 900000 + r.randint(0, 99), v=lambda i, r: r.choice("abc")),
+    "iso-step(": rows(
+        40, t=lambda i, r: f"2025-01-01T00:{i // 60:02d}:{i % 60:02d}Z", v=lambda i, r: r.choice("abc")
+    ),
+    "iso-for(": rows(
+        40, t=lambda i, r: f"2025-03-14 10:{r.randint(0, 59):02d}:{r.randint(0, 59):02d}+05:30",
+        v=lambda i, r: r.choice("abc"),
+    ),
+    "seq(ORD-,5000,1,@17=manual)": rows(
+        40, id=lambda i, r: "manual" if i == 17 else f"ORD-{5000 + i}", v=lambda i, r: r.choice("abc")
+    ),
+    "const(ap-south-1)": rows(40, region=lambda i, r: "ap-south-1", n=lambda i, r: r.randint(0, 10**6)),
+}
+
+
+@pytest.mark.parametrize("spec", CODEC_CASES)
+def test_codec(spec):
+    encoded = roundtrip(CODEC_CASES[spec])
+    assert "&CODEC=" in encoded["meta"] and spec in encoded["meta"]
+
+
+def test_iso_prefix_codec():
+    from coil_python.colcodec import int_codecs
+    from coil_python.enc import build_table
+
+    records = [
+        {"t": "2025-03-21T10:16:02Z", "v": "a,b"},
+        {"t": "2025-03-21T10:17:45Z", "v": "x"},
+        {"t": "2025-03-21T10:21:33Z", "v": "y"},
+    ]
+    table = build_table(records, ["t", "v"])
+    spec, cells = next(c for c in int_codecs(table.columns[0]) if c[0].startswith("iso-prefix("))
+    assert spec == "iso-prefix(2025-03-21T10:mm:ssZ)"
+
+    body = "|".join(f"{c},{v}" for c, v in zip(cells, table.columns[1].escaped))
+    encoded = {
+        "meta": f"META&ORDER=t,v&tid=tbl_1&CODEC=t:{spec}",
+        "body": f"BODY|table[3]{{t,v}}|{body}",
+    }
+    types = {"tbl_1": {**table.types(), "__codec__": {"t": "iso-prefix"}}}
+    assert coil_python.decode(encoded, structure=types) == records
+
+
+def test_non_ascii_digits():
+    payload = [
+        {"d": "٢٠٢٥-01-01", "id": "A١" if i == 0 else f"A{i}", "z": "X１", "n": i}
+        for i in range(20)
+    ]
+    roundtrip(payload)
+    roundtrip([{"id": f"X{d}", "n": i} for i, d in enumerate("１２３４５６７８")])
+
+# ---------------- LAYOUTS ----------------
+
+def test_ref_layout():
+    rnd = random.Random(2)
+    words = ["alpha beta", "gamma/delta", "eps zeta eta", "theta"]
+    base = [
+        {
+            "a": rnd.choice(words) + str(rnd.randint(0, 10**6)),
+            "b": rnd.randint(0, 10**9),
+            "c": rnd.choice(words),
+        }
+        for _ in range(5)
+    ]
+    encoded = roundtrip([dict(rnd.choice(base)) for _ in range(40)])
+    assert "LAYOUT=ref" in encoded["meta"]
+
+
+def test_col_layout():
+    payload = rows(2000, t=lambda i, r: 20 + (i // 50) % 7, h=lambda i, r: f"ok{(i // 300) % 3}")
+    encoded = roundtrip(payload)
+    assert "LAYOUT=col" in encoded["meta"]
+
+# ---------------- DICTIONARIES AND DELIMITERS ----------------
+
+CITIES = ["Bangalore", "Chennai", "Hyderabad"]
+
+
+def test_cmap():
+    payload = rows(
+        40, city=lambda i, r: r.choice(CITIES), st=lambda i, r: r.choice(["COMPLETED", "PENDING"]),
+        n=lambda i, r: r.randint(0, 10**6),
+    )
+    encoded = roundtrip(payload)
+    assert "&CMAP=city:" in encoded["meta"]
+
+
+def test_vmap_for_awkward_keys():
+    payload = rows(
+        40, **{"ns:from": lambda i, r: r.choice(CITIES), "ns:to": lambda i, r: r.choice(CITIES)},
+        n=lambda i, r: r.randint(0, 10**6),
+    )
+    encoded = roundtrip(payload)
+    assert "&vmap=" in encoded["meta"] and "CMAP" not in encoded["meta"]
+
+
+def test_awkward_keys_skip_codecs():
+    payload = rows(
+        40, **{"k;1": lambda i, r: r.choice("xy"), "ns:id": lambda i, r: f"A{i}"},
+        n=lambda i, r: 10 * i,
+    )
+    encoded = roundtrip(payload)
+    assert "ns:id:" not in encoded["meta"] and "k;1:" not in encoded["meta"]
+
+
+def test_fragments():
+    payload = rows(
+        40, url=lambda i, r: f"https://api.example.com/v2/users/{r.randint(0, 10**5)}/profile",
+        n=lambda i, r: r.randint(0, 10**6),
+    )
+    encoded = roundtrip(payload)
+    assert "&FRAG=" in encoded["meta"]
+
+
+def test_delims_with_escapes():
+    payload = rows(
+        40, k=lambda i, r: r.choice(["a,b", "c|d", "e;f", "g\\h"]) + str(r.randint(0, 10**5)),
+        m=lambda i, r: f"{r.randint(0, 9)},{r.randint(0, 9)}|x",
+    )
+    encoded = roundtrip(payload)
+    assert "&DELIM=" in encoded["meta"]
+
+
+def test_log_templates():
+    rnd = random.Random(4)
+    payload = [
+        f"INFO: user u{rnd.randint(0, 99)} logged in from 10.0.0.{rnd.randint(1, 254)}"
+        for _ in range(40)
+    ]
+    encoded = roundtrip(payload)
+    assert "&TPL=" in encoded["meta"]
+
+
+def test_shared_dictionary():
+    stops = ["Bangalore Central Station", "Chennai Egmore Junction", "Hyderabad Deccan Terminal"]
+    payload = {
+        f"t{j}": rows(5, j, **{"ns:stop": lambda i, r: r.choice(stops)}, n=lambda i, r: r.randint(0, 10**6))
+        for j in range(6)
+    }
+    encoded = roundtrip(payload, shared_dictionary=True)
+    assert encoded["meta"].startswith("META&SHARED=")
+
+
+def test_trained_dictionary():
+    def sample(seed):
+        return {
+            "orders": rows(
+                30, seed, city=lambda i, r: r.choice(CITIES),
+                st=lambda i, r: r.choice(["COMPLETED", "PENDING"]),
+                **{"ns:tag": lambda i, r: r.choice(["x", "y"])},
+            )
+        }
+
+    dictionary = coil_python.train_dictionary([sample(s) for s in range(5)])
+    payload = sample(9)
+    encoded, types = coil_python.encode(payload, return_structure=True, dictionary=dictionary)
+    assert encoded["meta"] == f"META&DICT={dictionary.id}"
+    assert coil_python.decode(encoded, structure=types, dictionary=dictionary) == payload
+
+# ---------------- WHOLE DOCUMENTS ----------------
+
+def test_prompt_document():
+    payload = {
+        "orders": CODEC_CASES["seq(ORD-,5000,1,@17=manual)"],
+        "stops": rows(30, city=lambda i, r: r.choice(CITIES), n=lambda i, r: r.randint(0, 10**6)),
+        "logs": [f"WARN: disk {i % 3} at {90 + i % 7}%" for i in range(20)],
+        "note": "plain | text, with: delimiters",
+    }
+    text = roundtrip(payload, output="text")
+    assert isinstance(text, str)
+
+
+def test_random_tables():
+    alphabet = ["a", "b", ",", "|", ":", ";", "\\", "&", " ", "1", "é"]
+    rnd = random.Random(7)
+    cell = {
+        "str": lambda: rnd.choice([rnd.choice(CITIES), "".join(rnd.choices(alphabet, k=rnd.randint(0, 4)))]),
+        "int": lambda: rnd.randint(-5, 5),
+    }
+    for _ in range(300):
+        # one type per column: the registry declares the first value's type
+        keys = rnd.sample(["k", "n", "ns:x", "k;1", "t"], rnd.randint(1, 4))
+        kinds = {k: rnd.choice(list(cell)) for k in keys}
+        roundtrip([{k: cell[kind]() for k, kind in kinds.items()} for _ in range(rnd.randint(2, 30))])